@@ -0,0 +1,85 @@
+# Benchmark: Input_Bank (one timer, vertical counter debouncing of all pins) vs. Button_Debounced (one IRQ per pin).
+#
+# Pin inputs are simulated: a sequence of GPIO_IN register values with bouncing edges is fed to
+# Input_Bank._sample() and, edge by edge, to Button_Debounced._on_button_changed().
+# Run on the Pico from a directory containing pico_lib/ and config/ (e.g. mqtt_pub_sub_01):
+#   mpremote run ../benchmarks/bench_input_bank.py
+# WARNING: GPIO 0..15 are configured as inputs with pull-up.
+
+import gc
+import random
+from utime import ticks_us, ticks_diff
+
+from pico_lib import Input_Bank, Button_Debounced
+
+PINS = list(range(16))
+SAMPLES = 2000
+BOUNCES = 3  # Number of bouncing samples after every change
+
+
+class _Simulated_Pin:
+    def __init__(self):
+        self.state = 1
+
+    def value(self):
+        return self.state
+
+
+def _simulated_inputs():
+    '''Returns list of GPIO_IN values: every 50th sample a random pin changes, bouncing a few samples.'''
+    values = []
+    value = (1 << len(PINS)) - 1
+    bouncing = 0
+    for i in range(SAMPLES):
+        if i % 50 == 0:
+            bouncing = 1 << random.choice(PINS)
+            value ^= bouncing
+            bounces = BOUNCES
+        if bouncing and bounces:
+            values.append(value ^ (bouncing if bounces % 2 else 0))
+            bounces -= 1
+        else:
+            values.append(value)
+    return values
+
+
+async def _no_callback(*_):
+    pass
+
+
+def main():
+    values = _simulated_inputs()
+
+    bank = Input_Bank(PINS, _no_callback)
+    gc.collect()
+    alloc_before = gc.mem_alloc()
+    changes = 0
+    start = ticks_us()
+    for value in values:
+        if bank._sample(value):
+            changes += 1
+    duration = ticks_diff(ticks_us(), start)
+    print('Input_Bank:       {} pins, {:6.1f} us/sample, {} batched changes, {} bytes allocated'.format(
+        len(PINS), duration / SAMPLES, changes, gc.mem_alloc() - alloc_before))
+
+    buttons = [Button_Debounced(pin, None) for pin in PINS]
+    pins = [_Simulated_Pin() for _ in PINS]
+    edges = 0
+    previous = values[0]
+    gc.collect()
+    start = ticks_us()
+    for value in values:
+        changed = value ^ previous
+        previous = value
+        for i in range(len(PINS)):
+            if changed & (1 << i):
+                pins[i].state = (value >> i) & 1
+                buttons[i]._on_button_changed(pins[i])
+                edges += 1
+        Button_Debounced._queue_index[1] = Button_Debounced._queue_index[0]  # Discard events
+    duration = ticks_diff(ticks_us(), start)
+    print('Button_Debounced: {} pins, {:6.1f} us/sample, {} IRQs (edges incl. bounces)'.format(
+        len(PINS), duration / SAMPLES, edges))
+
+
+main()
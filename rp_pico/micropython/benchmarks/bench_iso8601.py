@@ -0,0 +1,45 @@
+# Microbenchmark: Iso8601 formatting to new strings vs. formatting into a preallocated buffer, and parsing.
+#
+# Run on the Pico from a directory containing pico_lib/ and config/ (e.g. mqtt_pub_sub_01):
+#   mpremote run ../benchmarks/bench_iso8601.py
+# Prints time and heap allocation per call.
+
+import gc
+import time
+from utime import ticks_us, ticks_diff
+
+from pico_lib import Iso8601
+
+N = 1000
+
+
+def _bench(name, func):
+    gc.collect()
+    gc.disable()
+    alloc_before = gc.mem_alloc()
+    start = ticks_us()
+    for _ in range(N):
+        func()
+    duration = ticks_diff(ticks_us(), start)
+    alloc = gc.mem_alloc() - alloc_before
+    gc.enable()
+    print('{:45s} {:8.1f} us/call {:8.1f} bytes/call'.format(name, duration / N, alloc / N))
+
+
+def main():
+    gmtime = time.gmtime(1663331696)
+    rtc_datetime = (gmtime[0], gmtime[1], gmtime[2], gmtime[6], gmtime[3], gmtime[4], gmtime[5], 0)
+    buffer = bytearray(Iso8601.ISO_LENGTH_MS)
+    iso = Iso8601.formatTimeGmtimeToIso(gmtime).encode()
+    iso_ms = b'2022-09-16T12:34:56.789+00:00'
+
+    _bench('formatTimeGmtimeToIso()', lambda: Iso8601.formatTimeGmtimeToIso(gmtime))
+    _bench('formatTimeGmtimeToIsoBuffer()', lambda: Iso8601.formatTimeGmtimeToIsoBuffer(gmtime, buffer))
+    _bench('formatTimeGmtimeToIsoBuffer(), with ms', lambda: Iso8601.formatTimeGmtimeToIsoBuffer(gmtime, buffer, 789))
+    _bench('formatRtcDatetimeToIso()', lambda: Iso8601.formatRtcDatetimeToIso(rtc_datetime))
+    _bench('formatRtcDatetimeToIsoBuffer()', lambda: Iso8601.formatRtcDatetimeToIsoBuffer(rtc_datetime, buffer))
+    _bench('parseIsoToEpochMs()', lambda: Iso8601.parseIsoToEpochMs(iso))
+    _bench('parseIsoToEpochMs(), with ms', lambda: Iso8601.parseIsoToEpochMs(iso_ms))
+
+
+main()
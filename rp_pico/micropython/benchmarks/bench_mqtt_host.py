@@ -0,0 +1,250 @@
+# Benchmark: MQTTClient_enhanced against the local MQTT broker of host_emulation, run under CPython.
+#
+# Measures publish throughput (QoS 0 and 1), QoS 1 publish latency percentiles, inbound dispatch rate,
+# reconnect time and RAM per published/received message (tracemalloc, see host_emulation).
+# Run on the host from rp_pico/micropython:
+#   python benchmarks/bench_mqtt_host.py --out bench_mqtt.json [--baseline previous.json]
+# Results are written as JSON, --baseline prints the change of every result against a previous run.
+# Faults are injected with --latency-ms (delay of every packet sent by the broker) and --drop-rate
+# (probability that the broker ignores a PUBLISH, i.e. QoS 1 messages are republished).
+# --tls connects with TLS (needs openssl to create a certificate) and measures reconnects also without
+# TLS session resumption. Resumption isn't available on the Pico (MicroPython has no TLS sessions).
+# Numbers are CPython numbers, not the Pico's: compare runs on the same host.
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import host_emulation
+from host_emulation.mqtt_broker import Mqtt_Broker, create_certificate
+
+APP_DIR = 'mqtt_pub_sub_01'
+TOPIC_OUT = b'bench/out'
+TOPIC_IN = 'bench/in'
+TIMEOUT_S = 120
+# Metrics recorded by pico_lib (see Metrics.snapshot()) included in the results.
+METRICS = ('mqtt.puback_ms', 'mqtt.reconnect_ms', 'mqtt.tls_handshake_ms', 'mqtt.handler_us', 'alloc.mqtt.publish_approx', 'alloc.mqtt.receive_approx')
+
+
+def _percentiles(values):
+    '''Returns dict with mean, p50, p90, p99 and max of values.'''
+    if not values:
+        return {}
+    values = sorted(values)
+    def percentile(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))], 3)
+    return {'mean': round(sum(values) / len(values), 3), 'p50': percentile(0.5), 'p90': percentile(0.9),
+            'p99': percentile(0.99), 'max': round(values[-1], 3)}
+
+
+def _quiet_log_settings():
+    '''Log settings of the application with all levels set to ERROR: logging would dominate the results.'''
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), APP_DIR, 'config', 'log_settings.json')) as file:
+        log_settings = json.load(file)
+    sections = {}
+    for section in ('console_logger', 'file_logger'):
+        levels = log_settings[section]['log_levels_for_modules']
+        sections[section] = {
+            'default_log_level': 'ERROR',
+            'log_levels_for_modules': {module: 'ERROR' for module in levels},
+        }
+    return sections
+
+
+async def _wait_until(asyncio, condition):
+    '''Returns True if condition() became true within TIMEOUT_S.'''
+    deadline = time.perf_counter() + TIMEOUT_S
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep_ms(1)
+    return True
+
+
+async def _bench_publish(asyncio, client, broker, messages, qos, payload):
+    received = broker.received
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(messages):
+        t = time.perf_counter()
+        await client.publish(TOPIC_OUT, payload, qos = qos)
+        latencies.append((time.perf_counter() - t) * 1000)
+    complete = await _wait_until(asyncio, lambda: broker.received - received >= messages)
+    duration = time.perf_counter() - start
+    return {'messages': messages, 'complete': complete, 'msgs_per_s': round(messages / duration, 1),
+            'latency_ms': _percentiles(latencies)}
+
+
+def _publish_from_broker(broker, messages, payload):
+    '''Publishes messages in a thread of its own: the broker's socket writes must not block the event loop.'''
+    thread = threading.Thread(target = lambda: [broker.publish(TOPIC_IN, payload) for _ in range(messages)], daemon = True)
+    thread.start()
+    return thread
+
+
+async def _bench_dispatch(asyncio, client, broker, messages, payload, handled):
+    handled[0] = 0
+    dropped = client.get_inbound_queue_metrics()['dropped']
+    start = time.perf_counter()
+    _publish_from_broker(broker, messages, payload)
+    complete = await _wait_until(asyncio, lambda: handled[0] + client.get_inbound_queue_metrics()['dropped'] - dropped >= messages)
+    duration = time.perf_counter() - start
+    metrics = client.get_inbound_queue_metrics()
+    return {'messages': messages, 'complete': complete, 'handled': handled[0], 'msgs_per_s': round(handled[0] / duration, 1),
+            'dropped': metrics['dropped'] - dropped, 'max_queue_depth': metrics['max_depth']}
+
+
+async def _bench_reconnect(asyncio, client, broker, reconnects, established, resume = True):
+    '''resume = False: the TLS session isn't resumed, i.e. full handshake on every reconnect.'''
+    durations = []
+    resumed = 0
+    for _ in range(reconnects):
+        if not resume:
+            client._ssl_session = None
+        established.clear()
+        start = time.perf_counter()
+        broker.disconnect_all()
+        try:
+            await asyncio.wait_for(established.wait(), TIMEOUT_S)
+        except asyncio.TimeoutError:
+            break
+        durations.append((time.perf_counter() - start) * 1000)
+        resumed += bool(getattr(client._sock, 'session_reused', False))
+    return {'reconnects': len(durations), 'complete': len(durations) == reconnects, 'tls_sessions_resumed': resumed,
+            'duration_ms': _percentiles(durations)}
+
+
+async def _bench_ram(asyncio, client, broker, messages, payload, handled):
+    '''Bytes allocated (retained and peak) per message, traced with tracemalloc only during this benchmark.'''
+    results = {}
+    tracemalloc.start()
+    try:
+        for name in ('publish', 'receive'):
+            gc.collect()
+            before = gc.mem_alloc()
+            tracemalloc.reset_peak()
+            if name == 'publish':
+                for _ in range(messages):
+                    await client.publish(TOPIC_OUT, payload)
+            else:
+                handled[0] = 0
+                _publish_from_broker(broker, messages, payload)
+                await _wait_until(asyncio, lambda: handled[0] >= messages)
+            peak = tracemalloc.get_traced_memory()[1]
+            results[name] = {'messages': messages, 'bytes_per_msg': round((gc.mem_alloc() - before) / messages, 1),
+                             'peak_bytes': peak - before}
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+async def _run(args, broker):
+    import uasyncio as asyncio
+    from pico_lib import MQTTClient_enhanced, Metrics
+
+    payload = bytes(args.payload_size)
+    client = MQTTClient_enhanced()
+    established = asyncio.Event()
+
+    async def on_connection_established(client):
+        established.set()
+
+    handled = [0]
+
+    def on_message(topic, msg, retained):
+        handled[0] += 1
+
+    client.register_connection_established_handler(on_connection_established)
+    await client.connect()
+    await client.subscribe(TOPIC_IN, on_message)
+    client.intern_topic(TOPIC_IN)
+
+    results = {}
+    results['publish_qos0'] = await _bench_publish(asyncio, client, broker, args.messages, 0, payload)
+    results['publish_qos1'] = await _bench_publish(asyncio, client, broker, args.qos1_messages, 1, payload)
+    results['inbound_dispatch'] = await _bench_dispatch(asyncio, client, broker, args.messages, payload, handled)
+    results['reconnect'] = await _bench_reconnect(asyncio, client, broker, args.reconnects, established)
+    if args.tls:
+        results['reconnect_no_resumption'] = await _bench_reconnect(asyncio, client, broker, args.reconnects, established, False)
+    results['ram'] = await _bench_ram(asyncio, client, broker, args.ram_messages, payload, handled)
+    snapshot = Metrics.snapshot()
+    results['metrics'] = {name: snapshot[name] for name in METRICS if name in snapshot}
+    await client.disconnect()
+    return results
+
+
+def _flatten(results, prefix = ''):
+    '''Returns dict: 'path.to.value' -> value for all numeric values in results.'''
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(_flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+
+def _print_comparison(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = _flatten(json.load(file)['results'])
+    print('{:45s} {:>12s} {:>12s} {:>8s}'.format('result', 'baseline', 'current', 'change'))
+    for key, value in _flatten(results).items():
+        if key in baseline and not key.startswith('metrics.'):
+            old = baseline[key]
+            change = '{:+7.1f}%'.format((value - old) * 100 / old) if old else '       -'
+            print('{:45s} {:12} {:12} {}'.format(key, old, value, change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark MQTTClient_enhanced against a local broker.')
+    parser.add_argument('--messages', type = int, default = 1000, help = 'messages for QoS 0 and inbound benchmarks')
+    parser.add_argument('--qos1-messages', type = int, default = 100, help = 'messages for QoS 1 benchmark')
+    parser.add_argument('--ram-messages', type = int, default = 200, help = 'messages for RAM benchmark')
+    parser.add_argument('--payload-size', type = int, default = 64)
+    parser.add_argument('--reconnects', type = int, default = 5)
+    parser.add_argument('--latency-ms', type = float, default = 0, help = 'delay of every packet sent by the broker')
+    parser.add_argument('--drop-rate', type = float, default = 0, help = 'probability that a PUBLISH is dropped')
+    parser.add_argument('--tls', action = 'store_true', help = 'connect with TLS')
+    parser.add_argument('--out', help = 'JSON file for the results (default: print only)')
+    parser.add_argument('--baseline', help = 'JSON file of a previous run to compare with')
+    args = parser.parse_args()
+    # setup() changes the current directory to the Pico's filesystem.
+    args.out = os.path.abspath(args.out) if args.out else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    mqtt_settings = {'host': '127.0.0.1', 'use_ssl': args.tls}
+    certfile = keyfile = None
+    if args.tls:
+        # The broker's certificate is used as client certificate too, the broker doesn't verify it.
+        certfile, keyfile = create_certificate(tempfile.mkdtemp(prefix = 'bench_tls_'))
+        mqtt_settings.update(client_cert_file_path = certfile, private_key_file_path = keyfile)
+    broker = Mqtt_Broker(latency_ms = args.latency_ms, drop_rate = args.drop_rate, certfile = certfile, keyfile = keyfile).start()
+    mqtt_settings['port'] = broker.port
+    host_emulation.setup(APP_DIR, settings = {'mqtt': mqtt_settings}, log_settings = _quiet_log_settings())
+    import uasyncio as asyncio
+    results = asyncio.run(_run(args, broker))
+    broker.close()
+
+    report = {
+        'benchmark': 'bench_mqtt_host',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('out', 'baseline')},
+        'results': results,
+    }
+    print(json.dumps(results, indent = 4))
+    if args.baseline:
+        _print_comparison(results, args.baseline)
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump(report, file, indent = 4)
+
+
+main()
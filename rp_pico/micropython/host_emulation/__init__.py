@@ -0,0 +1,111 @@
+'''Host emulation: run pico_lib and the applications under CPython on Linux.
+
+setup() must be called before pico_lib is imported:
+- The MicroPython modules machine, network, usocket, uasyncio, utime, ubinascii, micropython etc.
+  are provided by the shims in host_emulation/lib (see there for the simulation API, e.g.
+  machine.Pin.simulate() and network.WLAN.simulate_link()).
+- gc.mem_free()/gc.mem_alloc() are emulated with tracemalloc (if trace_memory is set) on a heap of
+  HEAP_SIZE bytes, sys.print_exception() with traceback. CPython objects are several times larger
+  than MicroPython's: compare allocations between runs, not with the device.
+- The Pico's filesystem is a directory (default: new temporary directory) which becomes the current
+  directory. The config directory of the application is copied into it, settings can be overridden.
+
+Example:
+    import host_emulation
+    host_emulation.setup('mqtt_pub_sub_01', settings = {'mqtt': {'host': '127.0.0.1', 'port': 1883}})
+    from pico_lib import MQTTClient_enhanced
+'''
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+import tracemalloc
+
+HEAP_SIZE = 64 * 1024 * 1024  # Emulated heap, larger than on the Pico (~192 kB) because CPython objects are larger
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LIB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib')
+
+# Secrets aren't part of the repository, these defaults let the settings load.
+_DEFAULT_SECRETS = {
+    'wifi': {'ssid': 'host-emulation', 'password': ''},
+    'mqtt': {'username': '', 'password': ''},
+}
+# Defaults for the host: local broker without TLS.
+_DEFAULT_SETTINGS = {
+    'mqtt': {'host': '127.0.0.1', 'port': 1883, 'use_ssl': False},
+}
+
+
+def setup(app_dir = 'mqtt_pub_sub_01', root = None, settings = None, log_settings = None, trace_memory = False):
+    '''Set up emulation for application app_dir (relative to rp_pico/micropython), returns root directory.
+
+    root: directory used as filesystem of the Pico, default: new temporary directory.
+    settings / log_settings: dict of sections merged into config/app_settings.json / config/log_settings.json.
+    trace_memory: trace allocations with tracemalloc for gc.mem_alloc() (slows down execution).
+    '''
+    app_path = os.path.join(_BASE_DIR, app_dir)
+    for path in (_LIB_DIR, _BASE_DIR, app_path):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    _patch_builtins(trace_memory)
+
+    if root is None:
+        root = tempfile.mkdtemp(prefix = 'pico_')
+    config_src = os.path.join(app_path, 'config')
+    config_dst = os.path.join(root, 'config')
+    if os.path.isdir(config_src) and not os.path.exists(config_dst):
+        shutil.copytree(config_src, config_dst)
+    os.makedirs(config_dst, exist_ok = True)
+    _merge_json(os.path.join(config_dst, 'app_settings.json'), _DEFAULT_SETTINGS)
+    if settings:
+        _merge_json(os.path.join(config_dst, 'app_settings.json'), settings)
+    if log_settings:
+        _merge_json(os.path.join(config_dst, 'log_settings.json'), log_settings)
+    _create_log_directory(root, os.path.join(config_dst, 'log_settings.json'))
+    secrets = os.path.join(root, 'secret', 'app_secrets.json')
+    if not os.path.exists(secrets):
+        os.makedirs(os.path.dirname(secrets), exist_ok = True)
+        _merge_json(secrets, _DEFAULT_SECRETS)
+    os.chdir(root)
+    return root
+
+
+def _merge_json(path, sections):
+    data = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            data = json.load(file)
+    for section, values in sections.items():
+        if isinstance(values, dict):
+            data.setdefault(section, {}).update(values)
+        else:
+            data[section] = values
+    with open(path, 'w') as file:
+        json.dump(data, file, indent = 4)
+
+
+def _create_log_directory(root, log_settings_path):
+    '''The log directory is created once on the Pico (it isn't part of the config), do it here.'''
+    dirname = 'log'
+    if os.path.exists(log_settings_path):
+        with open(log_settings_path) as file:
+            dirname = json.load(file).get('file_logger', {}).get('dirname', dirname)
+    os.makedirs(os.path.join(root, dirname), exist_ok = True)
+
+
+def _mem_alloc():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def _patch_builtins(trace_memory):
+    '''Add MicroPython only functions to the builtin modules gc and sys.'''
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    gc.mem_alloc = _mem_alloc
+    gc.mem_free = lambda: max(0, HEAP_SIZE - _mem_alloc())
+    gc.threshold = lambda amount = None: -1
+    sys.print_exception = lambda exc, file = sys.stdout: traceback.print_exception(type(exc), exc, exc.__traceback__, file = file)
@@ -0,0 +1,183 @@
+'''machine for CPython: simulated Pins with IRQs, Timers, RTC and the GPIO_IN register of the RP2040.
+
+Host only API to drive the simulation:
+- Pin.simulate(id, level): set level of an input pin and call its IRQ handler if the edge matches.
+- Pin.get_level(id): level of a pin, e.g. of an output (LED).
+Timer callbacks run in a thread of their own, like IRQ handlers they interrupt the asyncio loop.
+'''
+import threading as _threading
+import time as _time
+
+_GPIO_IN = 0xd0000004
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    _levels = {}  # id -> level
+    _irqs = {}    # id -> (handler, trigger, Pin)
+    _lock = _threading.RLock()
+
+    def __init__(self, id, mode = -1, pull = -1, *, value = None):
+        self._id = id
+        with Pin._lock:
+            if value is not None:
+                Pin._levels[id] = 1 if value else 0
+            elif id not in Pin._levels or mode == Pin.IN:
+                if pull == Pin.PULL_UP:
+                    Pin._levels[id] = 1
+                elif pull == Pin.PULL_DOWN or id not in Pin._levels:
+                    Pin._levels[id] = 0
+
+    def __repr__(self):
+        return f'Pin({self._id})'
+
+    def value(self, value = None):
+        if value is None:
+            return Pin._levels.get(self._id, 0)
+        Pin._levels[self._id] = 1 if value else 0
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(1 - self.value())
+
+    def init(self, mode = -1, pull = -1, *, value = None):
+        self.__init__(self._id, mode, pull, value = value)
+
+    def irq(self, handler = None, trigger = IRQ_FALLING | IRQ_RISING, hard = False):
+        with Pin._lock:
+            if handler is None:
+                Pin._irqs.pop(self._id, None)
+            else:
+                Pin._irqs[self._id] = (handler, trigger, self)
+
+    @classmethod
+    def simulate(cls, id, level):
+        '''Set level of pin id (e.g. pressed button), calls IRQ handler in the calling thread.'''
+        level = 1 if level else 0
+        with cls._lock:
+            old = cls._levels.get(id, 0)
+            cls._levels[id] = level
+            irq = cls._irqs.get(id)
+        if irq and old != level:
+            handler, trigger, pin = irq
+            if trigger & (cls.IRQ_RISING if level else cls.IRQ_FALLING):
+                handler(pin)
+
+    @classmethod
+    def get_level(cls, id):
+        return cls._levels.get(id, 0)
+
+
+class _Mem32:
+    '''Word access to memory, only register GPIO_IN (levels of GPIO 0..29) is simulated.'''
+    def __getitem__(self, address):
+        if address == _GPIO_IN:
+            value = 0
+            for id, level in list(Pin._levels.items()):
+                if isinstance(id, int) and 0 <= id < 30 and level:
+                    value |= 1 << id
+            return value
+        return 0
+
+    def __setitem__(self, address, value):
+        pass
+
+
+mem32 = _Mem32()
+
+
+class Timer:
+    '''Hardware timer, the callback is called in a thread of its own.'''
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id = -1, *, mode = PERIODIC, period = -1, freq = -1, callback = None):
+        self._generation = 0
+        self._lock = _threading.Lock()
+        if callback is not None:
+            self.init(mode = mode, period = period, freq = freq, callback = callback)
+
+    def init(self, *, mode = PERIODIC, period = -1, freq = -1, callback = None):
+        if freq > 0:
+            period = 1000 / freq
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        if callback is None or period < 0:
+            return
+        thread = _threading.Thread(target = self._run, args = (generation, mode, period / 1000, callback), daemon = True)
+        thread.start()
+
+    def deinit(self):
+        with self._lock:
+            self._generation += 1
+
+    def _run(self, generation, mode, period, callback):
+        deadline = _time.monotonic()
+        while True:
+            deadline += period
+            delay = deadline - _time.monotonic()
+            if delay > 0:
+                _time.sleep(delay)
+            if self._generation != generation:
+                return
+            callback(self)
+            if mode == Timer.ONE_SHOT:
+                return
+
+
+class RTC:
+    '''Real time clock, the simulated time is the host's time plus an offset set by datetime().'''
+    _offset_ns = 0
+
+    def datetime(self, datetime = None):
+        '''Get or set (year, month, day, weekday, hours, minutes, seconds, subseconds).'''
+        import calendar
+        if datetime is None:
+            tm = _time.gmtime((_time.time_ns() + RTC._offset_ns) // 1000000000)
+            return (tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0)
+        year, month, day, _, hours, minutes, seconds = datetime[:7]
+        seconds = calendar.timegm((year, month, day, hours, minutes, seconds, 0, 0, 0))
+        RTC._offset_ns = seconds * 1000000000 - _time.time_ns()
+
+
+def unique_id():
+    return b'\xe6\x61\x41\x04\x03\x54\x5a\x2f'
+
+
+def freq(hz = None):
+    return 125000000
+
+
+def idle():
+    _time.sleep(0)
+
+
+def reset():
+    raise SystemExit('machine.reset()')
+
+
+def soft_reset():
+    raise SystemExit('machine.soft_reset()')
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state = 0):
+    pass
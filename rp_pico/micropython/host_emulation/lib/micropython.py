@@ -0,0 +1,29 @@
+'''micropython module for CPython.'''
+
+
+def const(value):
+    return value
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(function, argument):
+    function(argument)
+
+
+def opt_level(level = None):
+    return 0
+
+
+def mem_info(verbose = False):
+    import gc
+    print(f'mem: total={gc.mem_alloc() + gc.mem_free()}, current={gc.mem_alloc()}, free={gc.mem_free()}')
+
+
+def native(function):
+    return function
+
+
+viper = native
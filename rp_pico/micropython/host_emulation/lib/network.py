@@ -0,0 +1,77 @@
+'''network for CPython: simulated WLAN interface using the host's network.
+
+Host only API to drive the simulation:
+- WLAN.simulate_link(up): access point available (default) or not; going down disconnects the interface.
+- WLAN.connect_delay_ms: time from connect() until the interface is connected.
+'''
+import time as _time
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+    connect_delay_ms = 100
+
+    # The station interface is a singleton on the device: state is shared by all WLAN objects.
+    _link_up = True
+    _active = False
+    _connect_at = None  # time.monotonic() when connect() completes, None: not connecting/connected
+    _config = {'ssid': '', 'pm': 0xa11140, 'mac': b'\x28\xcd\xc1\x00\x00\x01', 'hostname': 'PicoW'}
+
+    def __init__(self, interface = STA_IF):
+        self._interface = interface
+
+    def active(self, is_active = None):
+        if is_active is None:
+            return WLAN._active
+        WLAN._active = bool(is_active)
+        if not is_active:
+            WLAN._connect_at = None
+
+    def connect(self, ssid = None, key = None, **kwargs):
+        if ssid is not None:
+            WLAN._config['ssid'] = ssid
+        WLAN._connect_at = _time.monotonic() + self.connect_delay_ms / 1000
+
+    def disconnect(self):
+        WLAN._connect_at = None
+
+    def status(self, param = None):
+        if param == 'rssi':
+            return -50
+        if WLAN._connect_at is None:
+            return STAT_IDLE
+        if not WLAN._link_up:
+            return STAT_NO_AP_FOUND
+        if _time.monotonic() < WLAN._connect_at:
+            return STAT_CONNECTING
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return WLAN._active and self.status() == STAT_GOT_IP
+
+    def ifconfig(self, config = None):
+        return ('127.0.0.1', '255.0.0.0', '127.0.0.1', '127.0.0.1')
+
+    def config(self, *args, **kwargs):
+        if args:
+            return WLAN._config.get(args[0])
+        WLAN._config.update(kwargs)
+
+    def scan(self):
+        return [(WLAN._config['ssid'].encode(), WLAN._config['mac'], 1, -50, 3, 0)] if WLAN._link_up else []
+
+    @classmethod
+    def simulate_link(cls, up):
+        '''Access point available or not, if it goes down the interface is disconnected.'''
+        cls._link_up = bool(up)
+        if not up:
+            cls._connect_at = None
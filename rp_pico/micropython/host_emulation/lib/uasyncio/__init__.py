@@ -0,0 +1,170 @@
+'''uasyncio for CPython: asyncio plus the MicroPython extensions used by pico_lib.
+
+- sleep_ms(), wait_for_ms(), ThreadSafeFlag (set() may be called from Timer/IRQ threads).
+- StreamReader(sock)/StreamWriter(sock) on non-blocking sockets, core._io_queue.queue_read(sock).
+- create_task() before the loop runs (as on MicroPython): the task is started by run().
+'''
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+from asyncio import CancelledError, TimeoutError
+
+from . import core
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(aw, timeout):
+    return await _asyncio.wait_for(aw, timeout / 1000)
+
+
+class _Pending_Task:
+    '''Task created before the loop runs, started by run().'''
+    def __init__(self, coro):
+        self._coro = coro
+        self._task = None
+        self._cancelled = False
+
+    def _start(self):
+        if self._cancelled:
+            self._coro.close()
+        else:
+            self._task = _asyncio.ensure_future(self._coro)
+
+    def cancel(self):
+        if self._task:
+            return self._task.cancel()
+        self._cancelled = True
+        return True
+
+    def done(self):
+        return self._task.done() if self._task else self._cancelled
+
+    def __await__(self):
+        while self._task is None:
+            yield from _asyncio.sleep(0).__await__()
+        return (yield from self._task.__await__())
+
+
+_pending = []
+
+
+def create_task(coro):
+    try:
+        _asyncio.get_running_loop()
+    except RuntimeError:
+        task = _Pending_Task(coro)
+        _pending.append(task)
+        return task
+    return _asyncio.create_task(coro)
+
+
+async def _main(main):
+    while _pending:
+        _pending.pop(0)._start()
+    return await main
+
+
+def run(main):
+    return _asyncio.run(_main(main))
+
+
+def new_event_loop():
+    '''Like on MicroPython: reset state, tasks created before the next run() are kept.'''
+    return None
+
+
+def get_event_loop():
+    try:
+        return _asyncio.get_running_loop()
+    except RuntimeError:
+        return _asyncio.new_event_loop()
+
+
+class ThreadSafeFlag:
+    '''Flag which can be set from any thread (IRQ handler, timer callback), awaited by one task.'''
+    def __init__(self):
+        self._flag = False
+        self._loop = None
+        self._waiter = None
+
+    def set(self):
+        self._flag = True
+        waiter = self._waiter
+        if waiter is not None:
+            self._loop.call_soon_threadsafe(self._wake, waiter)
+
+    @staticmethod
+    def _wake(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def clear(self):
+        self._flag = False
+
+    async def wait(self):
+        if not self._flag:
+            self._loop = _asyncio.get_running_loop()
+            self._waiter = self._loop.create_future()
+            try:
+                if not self._flag:  # set() may have been called meanwhile
+                    await self._waiter
+            finally:
+                self._waiter = None
+        self._flag = False
+
+
+class StreamReader:
+    '''Reader on a non-blocking (u)socket, like uasyncio.StreamReader(sock).'''
+    def __init__(self, sock, extra = None):
+        self._sock = sock
+
+    async def read(self, n = -1):
+        while True:
+            await core._io_queue._queue(self._sock, True)
+            data = self._sock.read(n)
+            if data is not None:
+                return data
+
+    async def readinto(self, buffer):
+        while True:
+            await core._io_queue._queue(self._sock, True)
+            n = self._sock.readinto(buffer)
+            if n is not None:
+                return n
+
+    async def readexactly(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = await self.read(n - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def close(self):
+        self._sock.close()
+
+    async def wait_closed(self):
+        pass
+
+
+class StreamWriter(StreamReader):
+    '''Writer on a non-blocking (u)socket, like uasyncio.StreamWriter(sock).'''
+    def __init__(self, sock, extra = None):
+        super().__init__(sock)
+        self._buffer = b''
+
+    def write(self, data):
+        self._buffer += data
+
+    async def drain(self):
+        while self._buffer:
+            await core._io_queue._queue(self._sock, False)
+            n = self._sock.write(self._buffer)
+            if n:
+                self._buffer = self._buffer[n:]
+
+
+Stream = StreamWriter
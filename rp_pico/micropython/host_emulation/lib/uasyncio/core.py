@@ -0,0 +1,41 @@
+'''uasyncio.core for CPython: the I/O queue, mapped onto the readers/writers of the running asyncio loop.
+
+queue_read(sock)/queue_write(sock) return a future which completes when sock is readable/writable,
+it can be yielded from an awaitable's __iter__()/__await__() as on MicroPython.
+'''
+import asyncio as _asyncio
+
+
+class _IO_Queue:
+    def queue_read(self, sock):
+        return self._blocking(self._queue(sock, True))
+
+    def queue_write(self, sock):
+        return self._blocking(self._queue(sock, False))
+
+    @staticmethod
+    def _blocking(future):
+        future._asyncio_future_blocking = True  # Yielded directly to the task, like Future.__await__()
+        return future
+
+    @staticmethod
+    def _queue(sock, read):
+        loop = _asyncio.get_running_loop()
+        future = loop.create_future()
+        fd = sock.fileno()
+        remove = loop.remove_reader if read else loop.remove_writer
+
+        def ready():
+            remove(fd)
+            if not future.done():
+                future.set_result(None)
+
+        if fd < 0:  # Socket closed
+            future.set_result(None)
+        else:
+            (loop.add_reader if read else loop.add_writer)(fd, ready)
+            future.add_done_callback(lambda _: remove(fd))
+        return future
+
+
+_io_queue = _IO_Queue()
@@ -0,0 +1,2 @@
+'''ubinascii for CPython.'''
+from binascii import *
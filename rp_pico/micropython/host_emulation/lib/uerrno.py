@@ -0,0 +1,2 @@
+'''uerrno for CPython.'''
+from errno import *
@@ -0,0 +1,2 @@
+'''uhashlib for CPython.'''
+from hashlib import *
@@ -0,0 +1,2 @@
+'''uio for CPython.'''
+from io import *
@@ -0,0 +1,2 @@
+'''uos for CPython.'''
+from os import *
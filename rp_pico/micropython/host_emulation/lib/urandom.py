@@ -0,0 +1,2 @@
+'''urandom for CPython.'''
+from random import getrandbits, randint, randrange, random, uniform, choice, seed
@@ -0,0 +1,2 @@
+'''uselect for CPython.'''
+from select import *
@@ -0,0 +1,39 @@
+'''usocket for CPython: real sockets with MicroPython's stream methods read(), readinto() and write().
+
+Like on MicroPython, non-blocking read(), readinto() and write() return None if no data can be transferred.
+'''
+import socket as _socket
+from socket import (AF_INET, AF_INET6, SOCK_STREAM, SOCK_DGRAM, SOCK_RAW, IPPROTO_TCP, IPPROTO_UDP,
+                    SOL_SOCKET, SO_REUSEADDR, getaddrinfo, inet_ntop, inet_pton, timeout)
+
+
+class socket(_socket.socket):
+    def __init__(self, af = AF_INET, type = SOCK_STREAM, proto = 0, fileno = None):
+        super().__init__(af, type, proto, fileno)
+
+    def read(self, size = -1):
+        try:
+            return self.recv(size if size >= 0 else 4096)
+        except BlockingIOError:
+            return None
+
+    def readinto(self, buffer, size = 0):
+        try:
+            return self.recv_into(buffer, size)
+        except BlockingIOError:
+            return None
+
+    def readline(self):
+        line = b''
+        while not line.endswith(b'\n'):
+            data = self.read(1)
+            if not data:
+                break
+            line += data
+        return line
+
+    def write(self, data):
+        try:
+            return self.send(data)
+        except BlockingIOError:
+            return None
@@ -0,0 +1,140 @@
+'''ussl for CPython: TLS with the host's ssl module, as stand-in for the Pico's mbedTLS.
+
+SSLContext (like MicroPython's) and the legacy wrap_socket() are provided. The handshake runs blocking,
+like on the Pico, afterwards the socket is non-blocking: read(), readinto() and write() return None if
+no data can be transferred. Certificates and keys are file paths or bytes (DER or PEM).
+Unlike MicroPython, CPython supports TLS session resumption: SSLSocket.session, .session_reused and
+SSLContext.wrap_socket(session = ...). So resumption measured here is not available on the Pico.
+'''
+import base64 as _base64
+import os as _os
+import ssl as _ssl
+import tempfile as _tempfile
+from ssl import PROTOCOL_TLS_CLIENT, PROTOCOL_TLS_SERVER, CERT_NONE, CERT_OPTIONAL, CERT_REQUIRED
+
+HANDSHAKE_TIMEOUT = 10  # s
+
+_BUSY = (_ssl.SSLWantReadError, _ssl.SSLWantWriteError, BlockingIOError)
+
+
+class SSLSocket:
+    '''Non-blocking TLS socket with MicroPython's stream methods.'''
+    def __init__(self, sock):
+        self._sock = sock
+
+    @property
+    def session(self):
+        return self._sock.session
+
+    @property
+    def session_reused(self):
+        return self._sock.session_reused
+
+    def read(self, size = -1):
+        try:
+            return self._sock.recv(size if size >= 0 else 4096)
+        except _BUSY:
+            return None
+
+    def readinto(self, buffer, size = 0):
+        try:
+            return self._sock.recv_into(buffer, size)
+        except _BUSY:
+            return None
+
+    def write(self, data):
+        try:
+            return self._sock.send(data)
+        except _BUSY:
+            return None
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def setblocking(self, flag):
+        self._sock.setblocking(flag)
+
+    def close(self):
+        self._sock.close()
+
+
+def _pem_file(data, labels):
+    '''Returns path of PEM file for data (path, PEM or DER bytes), labels: PEM labels to try for DER data.'''
+    if isinstance(data, str):
+        return [data]
+    if data.lstrip().startswith(b'-----'):
+        pems = [data]
+    else:
+        encoded = _base64.encodebytes(data).decode()
+        pems = [f'-----BEGIN {label}-----\n{encoded}-----END {label}-----\n'.encode() for label in labels]
+    paths = []
+    for pem in pems:
+        fd, path = _tempfile.mkstemp(suffix = '.pem')
+        with _os.fdopen(fd, 'wb') as file:
+            file.write(pem)
+        paths.append(path)
+    return paths
+
+
+class SSLContext:
+    def __init__(self, protocol):
+        self._context = _ssl.SSLContext(protocol)
+
+    @property
+    def check_hostname(self):
+        return self._context.check_hostname
+
+    @check_hostname.setter
+    def check_hostname(self, value):
+        self._context.check_hostname = value
+
+    @property
+    def verify_mode(self):
+        return self._context.verify_mode
+
+    @verify_mode.setter
+    def verify_mode(self, value):
+        self._context.verify_mode = value
+
+    def load_cert_chain(self, certfile, keyfile = None):
+        certs = _pem_file(certfile, ['CERTIFICATE'])
+        keys = _pem_file(keyfile, ['PRIVATE KEY', 'RSA PRIVATE KEY', 'EC PRIVATE KEY']) if keyfile else [None]
+        try:
+            for key in keys:  # DER keys: PKCS#8, PKCS#1 or SEC1
+                try:
+                    self._context.load_cert_chain(certs[0], key)
+                    return
+                except _ssl.SSLError as err:
+                    error = err
+            raise OSError(f'Loading certificate/key failed: {error}')
+        finally:
+            for path in certs + keys:
+                if path and path not in (certfile, keyfile):
+                    _os.remove(path)
+
+    def load_verify_locations(self, cafile = None, cadata = None):
+        self._context.load_verify_locations(cafile = cafile, cadata = cadata)
+
+    def wrap_socket(self, sock, server_side = False, do_handshake_on_connect = True, server_hostname = None, session = None):
+        sock.settimeout(HANDSHAKE_TIMEOUT)  # Blocking, waits for a non-blocking connect() in progress
+        ssl_sock = self._context.wrap_socket(sock, server_side = server_side, do_handshake_on_connect = False,
+                                             server_hostname = server_hostname, session = session)
+        if do_handshake_on_connect:
+            ssl_sock.do_handshake()
+        ssl_sock.setblocking(False)
+        return SSLSocket(ssl_sock)
+
+
+def wrap_socket(sock, key = None, cert = None, server_side = False, cert_reqs = CERT_NONE, cadata = None,
+                server_hostname = None, do_handshake = True):
+    '''Legacy API of MicroPython's ussl.'''
+    context = SSLContext(PROTOCOL_TLS_SERVER if server_side else PROTOCOL_TLS_CLIENT)
+    if not server_side:
+        context.check_hostname = False
+    context.verify_mode = cert_reqs
+    if cadata:
+        context.load_verify_locations(cadata = cadata)
+    if cert:
+        context.load_cert_chain(cert, key)
+    return context.wrap_socket(sock, server_side = server_side, do_handshake_on_connect = do_handshake,
+                               server_hostname = server_hostname)
@@ -0,0 +1,2 @@
+'''ustruct for CPython.'''
+from struct import *
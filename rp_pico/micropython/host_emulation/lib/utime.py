@@ -0,0 +1,65 @@
+'''utime for CPython: ticks with MicroPython's wrap-around arithmetic, wall-clock time from the simulated RTC.'''
+import time as _time
+import calendar as _calendar
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+_start = _time.monotonic_ns()
+
+
+def ticks_ms():
+    return ((_time.monotonic_ns() - _start) // 1000000) & _TICKS_MAX
+
+
+def ticks_us():
+    return ((_time.monotonic_ns() - _start) // 1000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep(seconds):
+    _time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    _time.sleep(us / 1000000)
+
+
+def time():
+    '''Seconds since 1970-01-01 (UTC) of the simulated RTC (see machine.RTC).'''
+    return int(time_ns() // 1000000000)
+
+
+def time_ns():
+    import machine
+    return _time.time_ns() + machine.RTC._offset_ns
+
+
+def gmtime(secs = None):
+    '''Returns (year, month, mday, hour, minute, second, weekday, yearday) like MicroPython.'''
+    if secs is None:
+        secs = time()
+    return tuple(_time.gmtime(secs))[:8]
+
+
+localtime = gmtime  # No time zone on the Pico
+
+
+def mktime(tm):
+    return _calendar.timegm(tuple(tm[:6]) + (0, 0, 0))
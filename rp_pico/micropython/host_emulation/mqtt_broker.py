@@ -0,0 +1,345 @@
+'''Minimal MQTT 3.1.1 broker for tests and benchmarks, in threads of the own process.
+
+Supported: CONNECT (clean and persistent sessions), PUBLISH QoS 0/1, retained messages, SUBSCRIBE
+(granted QoS <= 1) with + and # wildcards, UNSUBSCRIBE, PINGREQ, DISCONNECT. Not supported: QoS 2,
+will messages, authentication (username/password are ignored), redelivery of unacknowledged messages.
+
+Fault injection (can be changed while running):
+- latency_ms: delay before every packet sent by the broker (per connection).
+- drop_rate: probability that a received PUBLISH is ignored (not routed, no PUBACK).
+- disconnect_all(): closes all client connections, like a broker restart.
+- refuse_connections: CONNECT is answered with CONNACK 'server unavailable'.
+
+With certfile/keyfile (see create_certificate()) clients connect with TLS, client certificates aren't
+verified. TLS 1.3 session tickets are issued: clients supporting sessions can resume them.
+
+Example:
+    broker = Mqtt_Broker().start()
+    host_emulation.setup(settings = {'mqtt': {'host': '127.0.0.1', 'port': broker.port}})
+'''
+import os
+import random
+import socket
+import ssl
+import struct
+import subprocess
+import threading
+import time
+
+_CONNECT = 0x10
+_PUBLISH = 0x30
+_PUBACK = 0x40
+_SUBSCRIBE = 0x80
+_UNSUBSCRIBE = 0xa0
+_PINGREQ = 0xc0
+_DISCONNECT = 0xe0
+
+
+def create_certificate(directory):
+    '''Create self-signed certificate and key (with openssl) for the broker, returns (certfile, keyfile).'''
+    certfile = os.path.join(directory, 'broker_crt.pem')
+    keyfile = os.path.join(directory, 'broker_key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-keyout', keyfile, '-out', certfile], check = True, capture_output = True)
+    return certfile, keyfile
+
+
+def topic_matches(topic_filter, topic):
+    '''True if topic (str) matches topic_filter (str, may contain + and #).'''
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _Session:
+    '''Subscriptions of a client id, kept after disconnect if the client didn't request a clean session.'''
+    def __init__(self, client_id, clean):
+        self.client_id = client_id
+        self.clean = clean
+        self.subscriptions = {}  # topic filter -> granted qos
+        self.connection = None
+
+
+class _Connection:
+    '''Connection of one client, packets are received by a thread of its own.'''
+    def __init__(self, broker, sock):
+        self._broker = broker
+        self._sock = sock
+        self._send_lock = threading.Lock()
+        self._next_pid = 0
+        self.session = None
+
+    def start(self):
+        threading.Thread(target = self._serve, daemon = True).start()
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+    def send_packet(self, packet_type, body):
+        self.send_packets([(packet_type, body)])
+
+    def send_packets(self, packets):
+        '''Send list of (packet type, body) with one write, i.e. in one TLS record.'''
+        latency_ms = self._broker.latency_ms
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        data = bytearray()
+        for packet_type, body in packets:
+            length = len(body)
+            data.append(packet_type)
+            while True:
+                byte = length & 0x7f
+                length >>= 7
+                data.append(byte | 0x80 if length else byte)
+                if not length:
+                    break
+            data += body
+        with self._send_lock:
+            try:
+                self._sock.sendall(bytes(data))
+            except OSError:
+                pass  # Closed, detected by the receiving thread
+
+    def send_publish(self, topic, payload, qos, retain):
+        body = struct.pack('!H', len(topic)) + topic
+        if qos:
+            self._next_pid = self._next_pid % 65535 + 1
+            body += struct.pack('!H', self._next_pid)
+        self.send_packet(_PUBLISH | qos << 1 | retain, body + payload)
+
+    def _recv_exactly(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self._sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError('Connection closed by client')
+            data += chunk
+        return data
+
+    def _recv_packet(self):
+        packet_type = self._recv_exactly(1)[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = self._recv_exactly(1)[0]
+            length |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        return packet_type, self._recv_exactly(length)
+
+    def _serve(self):
+        try:
+            if self._broker._tls is not None:
+                self._sock = self._broker._tls.wrap_socket(self._sock, server_side = True)
+            packet_type, body = self._recv_packet()
+            if packet_type != _CONNECT or not self._broker._on_connect(self, body):
+                return
+            while True:
+                packet_type, body = self._recv_packet()
+                kind = packet_type & 0xf0
+                if kind == _PUBLISH:
+                    self._broker._on_publish(self, packet_type, body)
+                elif kind == _SUBSCRIBE:
+                    self._on_subscribe(body)
+                elif kind == _UNSUBSCRIBE:
+                    self._on_unsubscribe(body)
+                elif kind == _PINGREQ:
+                    self.send_packet(0xd0, b'')
+                elif kind == _DISCONNECT:
+                    return
+                # PUBACK of client: nothing to do, messages aren't redelivered.
+        except (OSError, ConnectionError, IndexError, struct.error):  # incl. ssl.SSLError
+            pass
+        finally:
+            self.close()
+            self._broker._on_disconnect(self)
+
+    def _on_subscribe(self, body):
+        pid = body[:2]
+        granted = bytearray()
+        offset = 2
+        topics = []
+        while offset < len(body):
+            length = struct.unpack_from('!H', body, offset)[0]
+            topic = body[offset + 2:offset + 2 + length].decode()
+            qos = min(body[offset + 2 + length], 1)
+            offset += 3 + length
+            granted.append(qos)
+            topics.append((topic, qos))
+        with self._broker._lock:
+            self.session.subscriptions.update(topics)
+        self.send_packet(0x90, pid + bytes(granted))
+        for topic_filter, qos in topics:
+            for topic, payload, retained_qos in self._broker._retained_matching(topic_filter):
+                self.send_publish(topic, payload, min(qos, retained_qos), 1)
+
+    def _on_unsubscribe(self, body):
+        offset = 2
+        while offset < len(body):
+            length = struct.unpack_from('!H', body, offset)[0]
+            with self._broker._lock:
+                self.session.subscriptions.pop(body[offset + 2:offset + 2 + length].decode(), None)
+            offset += 2 + length
+        self.send_packet(0xb0, body[:2])
+
+
+class Mqtt_Broker:
+    '''MQTT broker listening on host, port 0: any free port (see port after start()).'''
+
+    def __init__(self, host = '127.0.0.1', port = 0, latency_ms = 0, drop_rate = 0.0, certfile = None, keyfile = None) -> None:
+        self.latency_ms = latency_ms
+        self.drop_rate = drop_rate
+        self.refuse_connections = False
+        # Statistics
+        self.received = 0       # PUBLISH packets received (incl. dropped)
+        self.dropped = 0        # PUBLISH packets dropped by drop_rate
+        self.delivered = 0      # PUBLISH packets sent to subscribers
+        self.connects = 0       # Accepted CONNECTs
+        self.connect_times = []  # time.monotonic() of every CONNECT (incl. refused ones)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen(8)
+        self.port = self._socket.getsockname()[1]
+        self._lock = threading.Lock()
+        self._sessions = {}  # client id -> _Session
+        self._retained = {}  # topic (str) -> (topic (bytes), payload, qos)
+        self._random = random.Random(0)  # Reproducible drops
+        self._tls = None
+        if certfile:
+            self._tls = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self._tls.load_cert_chain(certfile, keyfile)
+
+    def start(self):
+        threading.Thread(target = self._accept, daemon = True).start()
+        return self
+
+    def close(self):
+        self._socket.close()
+        self.disconnect_all()
+
+    def disconnect_all(self):
+        '''Close all client connections (sessions are kept like after a restart with persistence).'''
+        with self._lock:
+            connections = [s.connection for s in self._sessions.values() if s.connection]
+        for connection in connections:
+            connection.close()
+
+    def connected_clients(self):
+        with self._lock:
+            return [s.client_id for s in self._sessions.values() if s.connection]
+
+    def publish(self, topic, payload, qos = 0, retain = False):
+        '''Publish message from the broker side, e.g. to load the inbound path of clients.'''
+        if isinstance(topic, str):
+            topic = topic.encode()
+        self._route(topic, bytes(payload), qos, retain)
+
+    def publish_many(self, topic, payloads):
+        '''Publish messages (QoS 0) from the broker side, all in one write per client (one TLS record),
+        like a broker flushing queued messages.'''
+        if isinstance(topic, str):
+            topic = topic.encode()
+        topic_str = topic.decode()
+        with self._lock:
+            receivers = [s.connection for s in self._sessions.values()
+                         if s.connection is not None and any(topic_matches(f, topic_str) for f in s.subscriptions)]
+            self.delivered += len(receivers) * len(payloads)
+        packets = [(_PUBLISH, struct.pack('!H', len(topic)) + topic + bytes(payload)) for payload in payloads]
+        for connection in receivers:
+            connection.send_packets(packets)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._socket.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            _Connection(self, sock).start()
+
+    def _on_connect(self, connection, body):
+        offset = 2 + struct.unpack_from('!H', body)[0] + 1  # Protocol name, level
+        flags = body[offset]
+        offset += 3  # Flags, keepalive
+        length = struct.unpack_from('!H', body, offset)[0]
+        client_id = body[offset + 2:offset + 2 + length].decode()
+        clean = bool(flags & 0x02)
+        self.connect_times.append(time.monotonic())
+        if self.refuse_connections:
+            connection.send_packet(0x20, b'\x00\x03')  # Server unavailable
+            return False
+        with self._lock:
+            session = self._sessions.get(client_id)
+            if session is not None and session.connection is not None:
+                session.connection.close()  # Client takeover, [MQTT-3.1.4-2]
+            session_present = session is not None and not clean
+            if not session_present:
+                session = _Session(client_id, clean)
+                self._sessions[client_id] = session
+            session.clean = clean
+            session.connection = connection
+            connection.session = session
+            self.connects += 1
+        connection.send_packet(0x20, bytes([1 if session_present else 0, 0]))
+        return True
+
+    def _on_disconnect(self, connection):
+        with self._lock:
+            session = connection.session
+            if session is not None and session.connection is connection:
+                session.connection = None
+                if session.clean:
+                    del self._sessions[session.client_id]
+
+    def _on_publish(self, connection, packet_type, body):
+        qos = (packet_type >> 1) & 0x03
+        length = struct.unpack_from('!H', body)[0]
+        topic = body[2:2 + length]
+        offset = 2 + length
+        if qos:
+            pid = body[offset:offset + 2]
+            offset += 2
+        with self._lock:
+            self.received += 1
+            drop = self.drop_rate and self._random.random() < self.drop_rate
+            if drop:
+                self.dropped += 1
+        if drop:
+            return
+        if qos:
+            connection.send_packet(_PUBACK, pid)
+        self._route(topic, body[offset:], qos, packet_type & 0x01)
+
+    def _route(self, topic, payload, qos, retain):
+        topic_str = topic.decode()
+        with self._lock:
+            if retain:
+                if payload:
+                    self._retained[topic_str] = (topic, payload, qos)
+                else:
+                    self._retained.pop(topic_str, None)
+            receivers = []
+            for session in self._sessions.values():
+                if session.connection is None:
+                    continue
+                granted = [q for f, q in session.subscriptions.items() if topic_matches(f, topic_str)]
+                if granted:
+                    receivers.append((session.connection, min(max(granted), qos)))
+            self.delivered += len(receivers)
+        for connection, receiver_qos in receivers:
+            connection.send_publish(topic, payload, receiver_qos, 0)
+
+    def _retained_matching(self, topic_filter):
+        with self._lock:
+            return [m for t, m in self._retained.items() if topic_matches(topic_filter, t)]
@@ -0,0 +1,57 @@
+'''Run application mqtt_pub_sub_01 (Mqtt_Subscriber) under CPython.
+
+Usage (from rp_pico/micropython):
+    python -m host_emulation.run_app [--broker | --host HOST --port PORT] [--root DIR] [--press GPIO ...]
+
+A local SNTP server replaces the NTP server. run_app connects without TLS (see ussl for TLS), e.g. to
+mosquitto, or --broker starts the broker of host_emulation.mqtt_broker in this process.
+--press simulates pressing and releasing buttons (GPIO) a few seconds after the start.
+'''
+import argparse
+import threading
+import time
+
+import host_emulation
+from host_emulation.mqtt_broker import Mqtt_Broker
+from host_emulation.sntp_server import Sntp_Server
+
+
+def _press_buttons(pins, delay):
+    import machine
+    time.sleep(delay)
+    for pin in pins:
+        machine.Pin.simulate(pin, 0)
+        time.sleep(0.5)
+        machine.Pin.simulate(pin, 1)
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Run mqtt_pub_sub_01 under CPython.')
+    parser.add_argument('--host', default = '127.0.0.1', help = 'MQTT broker')
+    parser.add_argument('--port', type = int, default = 1883)
+    parser.add_argument('--broker', action = 'store_true', help = 'start local MQTT broker (ignores --host/--port)')
+    parser.add_argument('--root', help = 'directory used as filesystem of the Pico (default: temporary directory)')
+    parser.add_argument('--press', type = int, nargs = '*', default = [], help = 'GPIOs of buttons to press')
+    parser.add_argument('--press-delay', type = float, default = 10, help = 'seconds until buttons are pressed')
+    args = parser.parse_args()
+
+    sntp_server = Sntp_Server().start()
+    if args.broker:
+        broker = Mqtt_Broker().start()
+        args.host, args.port = '127.0.0.1', broker.port
+    root = host_emulation.setup('mqtt_pub_sub_01', root = args.root, settings = {
+        'mqtt': {'host': args.host, 'port': args.port, 'use_ssl': False},
+        'ntp': {'host': '127.0.0.1'},
+    })
+    print(f'Filesystem of the Pico: {root}')
+
+    from pico_lib import Ntp_Client
+    Ntp_Client.NTP_PORT = sntp_server.port
+    if args.press:
+        threading.Thread(target = _press_buttons, args = (args.press, args.press_delay), daemon = True).start()
+    import pico_mqtt_main  # Runs the application, like main.py on the Pico
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''Minimal SNTP server (RFC 4330) answering with the host's time, so Ntp_Client works offline.'''
+import socket
+import struct
+import threading
+import time
+
+NTP_EPOCH = 2208988800
+
+
+class Sntp_Server:
+    '''SNTP server in a thread of its own, port 0: any free port (see port after start()).'''
+
+    def __init__(self, host = '127.0.0.1', port = 0) -> None:
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self.port = self._socket.getsockname()[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target = self._serve, daemon = True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._socket.close()
+
+    @staticmethod
+    def _timestamp(buffer, offset, seconds):
+        struct.pack_into('!II', buffer, offset, int(seconds) + NTP_EPOCH, int((seconds % 1) * (1 << 32)))
+
+    def _serve(self):
+        while True:
+            try:
+                request, addr = self._socket.recvfrom(48)
+            except OSError:
+                return
+            received = time.time()
+            if len(request) < 48:
+                continue
+            response = bytearray(48)
+            response[0] = 0x24  # LI = 0, VN = 4, mode = 4 (server)
+            response[1] = 1     # Stratum 1
+            response[24:32] = request[40:48]  # Originate timestamp = transmit timestamp of request
+            self._timestamp(response, 32, received)
+            self._timestamp(response, 40, time.time())
+            self._socket.sendto(response, addr)
@@ -1,29 +1,50 @@
 import uasyncio as asyncio
 import time
-from machine import Pin, RTC
+from machine import Pin
 
 from pico_lib import Wifi, Ntp_Client, MQTTClient_enhanced, Network_Utilities
-from pico_lib import Iso8601, Button_Debounced, Logger_Enhanced
+from pico_lib import Time_Service, Input_Bank, State_Publisher, Metrics_Exporter, Loop_Profiler, Logger_Enhanced
 _logger =  Logger_Enhanced.get_logger_for_module(__name__) 
 from status_led import MQTT_Client_Status, Status_Led
 
 
 class Mqtt_Subscriber:
+    # Inputs/outputs: (name used in topics, GPIO of button, GPIO of LED).
+    # Button n publishes inputs/<name>/isPressed and inputs/<name>/lastChangedAt, LED n shows inputs/<name>/isPressed.
+    _DEVICES = (
+        ('button0', 19, 16),  # red
+        ('button1', 20, 17),  # yellow
+        ('button2', 21, 18),  # green
+    )
+
     def __init__(self) -> None:
         MQTTClient_enhanced.DEBUG = True  # Optional
         self._client = MQTTClient_enhanced()
         self._client.register_connection_state_changed_handler(self._on_connection_state_changed)
         self._client.register_connection_established_handler(self._on_connection_established)
+        # Publishes latest state per topic, at most every 250 ms per topic.
+        self._publisher = State_Publisher(self._client, min_interval_ms = 250, qos = 1)
+        # Publishes runtime metrics (see config/app_settings.json, section metrics).
+        self._metrics_exporter = Metrics_Exporter(self._client)
         self._status_led = Status_Led()
         self._status_led.start()
 
-        self._led_red    = Pin(16, Pin.OUT, value = 0)
-        self._led_yellow = Pin(17, Pin.OUT, value = 0)
-        self._led_green  = Pin(18, Pin.OUT, value = 0)
-
-        self._button_red    = Button_Debounced(19, self._on_button_changed, 'button_red')
-        self._button_yellow = Button_Debounced(20, self._on_button_changed, 'button_yellow')
-        self._button_green  = Button_Debounced(21, self._on_button_changed, 'button_green')
+        # Routing tables with precomputed topics:
+        # - GPIO of button -> (topic isPressed, topic lastChangedAt) for publishing.
+        # - Id of received topic (interned by client) -> (handler, argument) for dispatching received messages.
+        self._input_topics = {}
+        self._routes = {}
+        for name, button_pin, led_pin in self._DEVICES:
+            led = Pin(led_pin, Pin.OUT, value = 0)
+            topic_is_pressed = b'inputs/' + name.encode() + b'/isPressed'
+            topic_last_changed_at = b'inputs/' + name.encode() + b'/lastChangedAt'
+            self._input_topics[button_pin] = (topic_is_pressed, topic_last_changed_at)
+            self._routes[self._client.intern_topic(topic_is_pressed)] = (self._on_is_pressed, led)
+            self._routes[self._client.intern_topic(topic_last_changed_at)] = (self._on_last_changed_at, name)
+
+        # All buttons are sampled and debounced together by one input bank.
+        self._buttons = Input_Bank(self._input_topics.keys(), self._on_buttons_changed)
+        self._buttons.start()
 
     def start(self):
         '''Start async main program.'''
@@ -41,6 +62,8 @@ class Mqtt_Subscriber:
 
     async def _main(self):
         '''This is the async main program.'''
+        # Measure how long the event loop is blocked (histogram loop.lag_ms, exported with the metrics).
+        Loop_Profiler.start_lag_monitor()
         # Connect to WiFi ...
         self._status_led.set_status(MQTT_Client_Status.connecting_wifi)
         wifi = Wifi()
@@ -62,6 +85,11 @@ class Mqtt_Subscriber:
         # Connect to MQTT host ...
         await self._client.connect()
         self._status_led.set_status(MQTT_Client_Status.connected_mqtt_server)
+        # Subscribed once, the client restores its subscriptions on reconnect.
+        _logger.info("Subscribing MQTT topic 'inputs/#' ...")
+        await self._client.subscribe('inputs/#', self._led_handler)
+        self._publisher.start()
+        self._metrics_exporter.start()
 
         # Main loop does nothing ...
         while True:
@@ -77,23 +105,25 @@ class Mqtt_Subscriber:
             self._status_led.set_status(MQTT_Client_Status.connection_interrupted)
 
     async def _on_connection_established(self, client):
-        '''Called upon connection to MQTT server has been established.'''
-        _logger.info("Subscribing MQTT topic 'inputs/#' ...")
-        await client.subscribe('inputs/#', self._led_handler)
+        '''Called upon connection to MQTT server has been established, subscriptions are already restored.'''
+        _logger.info(f"Connection to MQTT broker '{client.server}' established, session present: {client.session_present}.")
 
     def _led_handler(self, topic, msg, retained):
-        _logger.debug(f'Receiced message for topic {topic.decode()}: {msg.decode()}.')
-        topic_segments = topic.decode().split('/')
-        if topic_segments[2] == 'isPressed':
-            is_on = msg == 'True'
-            if topic_segments[1] == 'button0':
-                self._switch_led(self._led_red, is_on)
-            elif topic_segments[1] == 'button1':
-                self._switch_led(self._led_yellow, is_on)
-            elif topic_segments[1] == 'button2':
-                self._switch_led(self._led_green, is_on)
-        elif topic_segments[2] == 'lastChangedAt':
-            _logger.info(f"Button '{topic_segments[1]} changed at {msg.decode()}.'")
+        '''topic and msg are memoryviews into the client's receive buffer, valid only during this call.
+
+        Zero-copy needs mqtt.rx_buffer_size > 0 and mqtt.inbound_queue_size = 0 (otherwise they are bytes),
+        the handler is fast: it's called while receiving.
+        '''
+        route = self._routes.get(self._client.topic_id(topic))
+        if route:
+            handler, argument = route
+            handler(argument, msg)
+
+    def _on_is_pressed(self, led, msg):
+        self._switch_led(led, b'True' == msg)  # bytes on the left: compares with memoryview
+
+    def _on_last_changed_at(self, name, msg):
+        _logger.info(f"Button '{name} changed at {bytes(msg).decode()}.'")
 
     def _switch_led(self, led, is_on):
         if is_on == True:
@@ -101,25 +131,14 @@ class Mqtt_Subscriber:
         else:
             led.off()
 
-    async def _on_button_changed(self, name, state):
-        _logger.debug(f"Calling button callback for {name}, state {state}.")
-        topic_1 = ''
-        value_1 = 'True' if state == 0 else 'False'
-        topic_2 = ''
-        value_2 = Iso8601.formatRtcDatetimeToIso(RTC().datetime())
-        if name == 'button_red':
-            topic_1 = 'inputs/button0/isPressed'
-            topic_2 = 'inputs/button0/lastChangedAt'
-        elif name == 'button_yellow':
-            topic_1 = 'inputs/button1/isPressed'
-            topic_2 = 'inputs/button1/lastChangedAt'
-        elif name == 'button_green':
-            topic_1 = 'inputs/button2/isPressed'
-            topic_2 = 'inputs/button2/lastChangedAt'
-        _logger.info(f'Publishing topic={topic_1}, value={value_1} ...')
-        await self._client.publish(topic_1, value_1, qos = 1)
-        _logger.info(f'Publishing topic={topic_2}, value={value_2} ...')
-        await self._client.publish(topic_2, value_2, qos = 1)
+    async def _on_buttons_changed(self, changes):
+        for pin, state in changes:
+            topic_is_pressed, topic_last_changed_at = self._input_topics[pin]
+            value_1 = 'True' if state == 0 else 'False'
+            value_2 = Time_Service.now_iso()
+            # No log per change, State_Publisher logs what it sends at level DEBUG.
+            self._publisher.publish(topic_is_pressed, value_1)
+            self._publisher.publish(topic_last_changed_at, value_2)
 
 
 import micropython
@@ -1,11 +1,11 @@
-import uasyncio as asyncio
-import time
-import _thread
-from machine import Pin
+from machine import Pin, Timer
+from utime import ticks_us, ticks_diff
 
-from pico_lib import Logger_Enhanced
+from pico_lib import Loop_Profiler, Logger_Enhanced
 _logger =  Logger_Enhanced.get_logger_for_module(__name__) 
 
+_profile = Loop_Profiler.section('status_led')  # Timer callback: must not allocate
+
 class MQTT_Client_Status:
     undefined = 0
     connecting_wifi = 1
@@ -24,44 +24,62 @@ class Status_Led:
     - LED on -> connection to MQTT broker, including TLS handshake.
     - 1 flash about every 2 secons -> connected to MQTT broker.
     - blinking 500ms/500ms -> connection is interrupted, trying to reconnect.
+
+    The LED is driven by a one-shot machine.Timer stepping through a precomputed blink pattern,
+    set_status() only swaps the pattern. Steady states (LED on/off) don't use the timer at all,
+    so there is no cost in the asyncio loop.
     '''
+    # Blink pattern per status: durations (ms) of alternating LED on / off phases, starting with on.
+    # True / False: LED is steadily on / off.
+    _PATTERNS = {
+        MQTT_Client_Status.undefined: False,
+        MQTT_Client_Status.connecting_wifi: (10, 100, 10, 510),
+        MQTT_Client_Status.synchronizing_rtc: (10, 100, 10, 100, 10, 510),
+        MQTT_Client_Status.resolving_hostname: False,
+        MQTT_Client_Status.connecting_mqtt_server: True,
+        MQTT_Client_Status.connected_mqtt_server: (10, 2010),
+        MQTT_Client_Status.connection_interrupted: (1000, 1010),
+    }
+
     def __init__(self) -> None:
         self._status = MQTT_Client_Status.undefined
         self._led = Pin('LED', Pin.OUT, value = 0)
+        self._timer = Timer()
+        self._pattern = False
+        self._step = 0
+        self._started = False
+        self._timer_callback = self._on_timer  # Bind method only once
 
     def start(self):
         try:
-            _logger.debug(f'Starting {__name__} task ...')
-            asyncio.create_task(self._update_tatus_led_task())
-            pass
+            _logger.debug(f'Starting {__name__} ...')
+            self._started = True
+            self._apply_pattern()
         except Exception as err:
-            _logger.error(f'Status LED updater task failed: err={err}, type={type(err)}')
+            _logger.error(f'Status LED failed: err={err}, type={type(err)}')
 
     def set_status(self, status):
-        self._status = status
+        if status != self._status:
+            self._status = status
+            if self._started:
+                self._apply_pattern()
 
-    async def _update_tatus_led_task(self):
-        while True:
-            if self._status == MQTT_Client_Status.undefined:
-                self._led.off()
-            elif self._status == MQTT_Client_Status.connecting_wifi:
-                await self.blink(2)
-            elif self._status == MQTT_Client_Status.synchronizing_rtc:
-                await self.blink(3)
-            elif self._status == MQTT_Client_Status.connecting_mqtt_server:
-                self._led.on()
-            elif self._status == MQTT_Client_Status.connected_mqtt_server:
-                await self.blink(1, off_time=2000)
-            elif self._status == MQTT_Client_Status.connection_interrupted:
-                await self.blink(1, on_time=1000, off_time=1000, last_off_time=1000)
-            else:
-                self._led.off()
-            await asyncio.sleep_ms(10)
+    def _apply_pattern(self):
+        self._timer.deinit()
+        self._pattern = self._PATTERNS.get(self._status, False)
+        self._step = 0
+        if isinstance(self._pattern, tuple):
+            self._on_timer(None)
+        else:
+            self._led.value(self._pattern)
 
-    async def blink(self, count, on_time = 10, off_time = 100, last_off_time = 500):
-        for i in range(count):
-            self._led.on()
-            await asyncio.sleep_ms(on_time)
-            self._led.off()
-            await asyncio.sleep_ms(off_time)
-        await asyncio.sleep_ms(last_off_time - off_time)
+    def _on_timer(self, timer):
+        pattern = self._pattern
+        if not isinstance(pattern, tuple):  # Status has changed to steady state meanwhile
+            return
+        t = ticks_us()
+        step = self._step
+        self._led.value(1 - step % 2)  # Even steps: LED on
+        self._step = (step + 1) % len(pattern)
+        self._timer.init(mode=Timer.ONE_SHOT, period=pattern[step], callback=self._timer_callback)
+        _profile.record(ticks_diff(ticks_us(), t))
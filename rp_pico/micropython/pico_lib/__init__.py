@@ -6,5 +6,13 @@ from .networking import Network_Utilities
 from .udp_client import Udp_Client
 from .ntp_client import Ntp_Client
 from .iso8601 import Iso8601
+from .time_service import Time_Service
 from .mqtt_as_enhanced import MQTTClient_enhanced
-from .button_debounced import Button_Debounced
\ No newline at end of file
+from .button_debounced import Button_Debounced
+from .input_bank import Input_Bank
+from .state_publisher import State_Publisher
+
+from .metrics import Metrics
+from .metrics_exporter import Metrics_Exporter
+from .loop_profiler import Loop_Profiler
+from .heap_monitor import Heap_Monitor
\ No newline at end of file
@@ -1,27 +1,172 @@
-from machine import Pin
+from machine import Pin, Timer
+from array import array
+from utime import ticks_ms, ticks_diff, ticks_add
 import uasyncio as asyncio
-import time
 
 from .logging_enhanced import Logger_Enhanced
-_logger =  Logger_Enhanced.get_logger_for_module(__name__) 
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
 
 class Button_Debounced:
-    def __init__(self, pin, callback, name = None, pull_up_down = Pin.PULL_UP, debouncing_time = 20) -> None:
+    '''Debounced button (GPIO input) calling an async callback(name, state) on every state change.
+
+    The (hard) IRQ handler only writes index of button, pin state and timestamp into a preallocated
+    ring buffer, shared by all buttons, and sets a ThreadSafeFlag. It doesn't allocate memory.
+    A single dispatcher task, started with the first button, drains the ring buffer and debounces:
+    debouncing_time ms after the last edge a one-shot timer wakes up the dispatcher, which reads the
+    now stable pin state and calls the callback if it has changed. So a change is reported one
+    debouncing window after the edge and the trailing edge of a bounce (e.g. a fast release) isn't lost.
+
+    Optionally an async event_callback(name, event, duration) is called with events:
+    - EVENT_RELEASED: button released, duration = time the button was pressed (ms).
+    - EVENT_LONG_PRESS: button pressed for long_press_time ms.
+    - EVENT_REPEAT: button still pressed, every repeat_time ms after the long press event.
+    Durations are measured from the first edge of the press.
+    '''
+    QUEUE_SIZE = 32
+    EVENT_RELEASED = 'released'
+    EVENT_LONG_PRESS = 'long_press'
+    EVENT_REPEAT = 'repeat'
+
+    _buttons = []  # index -> Button_Debounced
+    _queue_buttons = bytearray(QUEUE_SIZE)
+    _queue_states = bytearray(QUEUE_SIZE)
+    _queue_ticks = array('i', [0] * QUEUE_SIZE)
+    # [0]: head (written by IRQ handler), [1]: tail (written by dispatcher), [2]: number of lost events.
+    _queue_index = array('i', [0, 0, 0])
+    _flag = asyncio.ThreadSafeFlag()
+    _dispatcher = None
+    _timer = None
+
+    def __init__(self, pin, callback, name = None, pull_up_down = Pin.PULL_UP, debouncing_time = 20, *,
+                 event_callback = None, long_press_time = None, repeat_time = None) -> None:
         self._callback = callback
+        self._event_callback = event_callback
         self._name = name if name else f'button_{pin}'
         self._debouncing_time = debouncing_time
+        self._long_press_time = long_press_time
+        self._repeat_time = repeat_time
+        self._pressed_state = 0 if pull_up_down == Pin.PULL_UP else 1
+        self._state = 1 - self._pressed_state
+        self._first_edge = None     # ticks of first edge not yet confirmed, None if no edge pending
+        self._last_edge = None      # ticks of last edge
+        self._pressed_at = None     # ticks of first edge of current press
+        self._next_hold_event = None  # ticks of next long press / repeat event
+        self._index = len(Button_Debounced._buttons)
+        Button_Debounced._buttons.append(self)
+        if Button_Debounced._dispatcher is None:
+            Button_Debounced._timer = Timer()
+            Button_Debounced._dispatcher = asyncio.create_task(Button_Debounced._dispatch())
         self._button = Pin(pin, Pin.IN, pull_up_down)
-        self._button.irq(handler=self._on_button_changed, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
-        self._last_changed = time.ticks_ms()
-        self._state = 1 if pull_up_down == Pin.PULL_UP else 0
+        self._button.irq(handler=self._on_button_changed, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, hard=True)
+
+    def get_state(self):
+        '''Returns debounced state of button.'''
+        return self._state
+
+    def get_lost_events(self):
+        '''Returns number of pin changes lost because the ring buffer was full (all buttons).'''
+        return Button_Debounced._queue_index[2]
 
     def _on_button_changed(self, button):
-        now = time.ticks_ms()
-        state = button.value()
+        '''IRQ handler, must not allocate memory.'''
+        index = Button_Debounced._queue_index
+        head = index[0]
+        next_head = (head + 1) % Button_Debounced.QUEUE_SIZE
+        if next_head == index[1]:
+            index[2] += 1  # Ring buffer full
+            return
+        Button_Debounced._queue_buttons[head] = self._index
+        Button_Debounced._queue_states[head] = button.value()
+        Button_Debounced._queue_ticks[head] = ticks_ms()
+        index[0] = next_head
+        Button_Debounced._flag.set()
+
+    def _on_edge(self, state, ticks):
+        '''Called by dispatcher for every recorded pin change.'''
+        _logger.debug(f"Button '{self._name}': edge to {state}.")
+        if self._first_edge is None:
+            self._first_edge = ticks
+        self._last_edge = ticks
+
+    def _update(self, now):
+        '''Confirm pending change and emit due long press / repeat events.
+
+        Called by dispatcher. Returns time (ms) until the next deadline of this button or None.
+        '''
+        timeout = None
+        if self._first_edge is not None:
+            remaining = self._debouncing_time - ticks_diff(now, self._last_edge)
+            if remaining > 0:
+                timeout = remaining
+            else:
+                first_edge = self._first_edge
+                self._first_edge = None
+                state = self._button.value()
+                if state != self._state:
+                    self._state = state
+                    self._on_state_changed(state, first_edge)
+        if self._next_hold_event is not None:
+            remaining = ticks_diff(self._next_hold_event, now)
+            if remaining <= 0:
+                duration = ticks_diff(now, self._pressed_at)
+                if self._repeat_time and ticks_diff(self._next_hold_event, self._pressed_at) > self._long_press_time:
+                    self._emit(self.EVENT_REPEAT, duration)
+                else:
+                    self._emit(self.EVENT_LONG_PRESS, duration)
+                if self._repeat_time:
+                    self._next_hold_event = ticks_add(self._next_hold_event, self._repeat_time)
+                    remaining = ticks_diff(self._next_hold_event, now)
+                else:
+                    self._next_hold_event = None
+            if self._next_hold_event is not None and (timeout is None or remaining < timeout):
+                timeout = remaining
+        return timeout
+
+    def _on_state_changed(self, state, ticks):
         _logger.debug(f"Button '{self._name}' changes state to {state}.")
-        if ((now - self._last_changed) > self._debouncing_time) and (state != self._state):
-            self._last_changed = now
-            self._state = state
-            if self._callback:
-                cb = self._callback
-                asyncio.create_task(self._callback(self._name, button.value()))
\ No newline at end of file
+        if self._callback:
+            asyncio.create_task(self._callback(self._name, state))
+        if state == self._pressed_state:
+            self._pressed_at = ticks
+            if self._long_press_time:
+                self._next_hold_event = ticks_add(ticks, self._long_press_time)
+        elif self._pressed_at is not None:
+            self._next_hold_event = None
+            self._emit(self.EVENT_RELEASED, ticks_diff(ticks, self._pressed_at))
+            self._pressed_at = None
+
+    def _emit(self, event, duration):
+        _logger.debug(f"Button '{self._name}': event {event}, duration {duration} ms.")
+        if self._event_callback:
+            asyncio.create_task(self._event_callback(self._name, event, duration))
+
+    @staticmethod
+    def _on_timer(timer):
+        Button_Debounced._flag.set()
+
+    @classmethod
+    async def _dispatch(cls):
+        '''Dispatcher task: drain ring buffer, debounce and call callbacks of the buttons.'''
+        index = cls._queue_index
+        while True:
+            await cls._flag.wait()
+            while index[1] != index[0]:
+                tail = index[1]
+                button = cls._buttons[cls._queue_buttons[tail]]
+                state = cls._queue_states[tail]
+                ticks = cls._queue_ticks[tail]
+                index[1] = (tail + 1) % cls.QUEUE_SIZE
+                button._on_edge(state, ticks)
+            now = ticks_ms()
+            next_deadline = None
+            for button in cls._buttons:
+                try:
+                    timeout = button._update(now)
+                except Exception as err:
+                    timeout = None
+                    _logger.error(f'_dispatch(): Unexpected error for button \'{button._name}\': {err}, {type(err)}')
+                if timeout is not None and (next_deadline is None or timeout < next_deadline):
+                    next_deadline = timeout
+            if next_deadline is not None:
+                # Wake up dispatcher when debouncing window / long press time of a button has elapsed.
+                cls._timer.init(mode=Timer.ONE_SHOT, period=max(1, next_deadline), callback=cls._on_timer)
@@ -0,0 +1,61 @@
+import gc
+from utime import ticks_us, ticks_diff
+
+from .metrics import Metrics
+
+
+class Heap_Monitor:
+    '''Allocation tracking for instrumented sections and threshold based garbage collection.
+
+    A section records the bytes allocated between begin() and end() (gc.mem_alloc() delta) in histogram
+    'alloc.<name>' (see Metrics), e.g.:
+        _alloc_publish = Heap_Monitor.histogram('mqtt.publish')  # Once, at module level
+        start = Heap_Monitor.begin()
+        ...
+        Heap_Monitor.end(_alloc_publish, start)
+    Sections spanning an await include allocations of other tasks: name them '..._approx'. If a garbage
+    collection happened within the section the delta is meaningless and isn't recorded: collections by
+    collect() and by Metrics (heap probes) are detected by their count, automatic ones (heap exhausted)
+    only if gc.mem_alloc() dropped below its value at begin(). end() also updates the heap high-water
+    mark (gauge 'heap.high_water', max. of gc.mem_alloc()).
+    collect(min_free) collects only if less than min_free bytes are free, the number and duration of
+    collections are recorded ('gc.collections', 'gc.collect_us'), so the effect on latency is measurable.
+    '''
+    ALLOC_BYTES = (0, 16, 64, 256, 1024, 4096, 16384)
+
+    _high_water = Metrics.gauge('heap.high_water')
+    _collections = Metrics.counter('gc.collections')
+    _collect_us = Metrics.histogram('gc.collect_us', (1000, 2000, 5000, 10000, 20000, 50000, 100000))
+
+    @classmethod
+    def histogram(cls, name):
+        '''Returns histogram for section name, call once per section.'''
+        return Metrics.histogram('alloc.' + name, cls.ALLOC_BYTES)
+
+    @classmethod
+    def begin(cls):
+        '''Returns start of section for end(): gc.mem_alloc() and number of collections as one small int.'''
+        return gc.mem_alloc() << 8 | cls._collections.value & 0xff
+
+    @classmethod
+    def end(cls, histogram, start):
+        allocated = gc.mem_alloc()
+        if allocated > cls._high_water.value:
+            cls._high_water.value = allocated
+        start_allocated = start >> 8
+        if start & 0xff == cls._collections.value & 0xff and allocated >= start_allocated:
+            histogram.record(allocated - start_allocated)
+
+    @classmethod
+    def collect(cls, min_free = None):
+        '''gc.collect() if less than min_free bytes are free (None: always). Returns True if collected.'''
+        if min_free is not None and gc.mem_free() >= min_free:
+            return False
+        allocated = gc.mem_alloc()
+        if allocated > cls._high_water.value:
+            cls._high_water.value = allocated
+        t = ticks_us()
+        gc.collect()
+        cls._collect_us.record(ticks_diff(ticks_us(), t))
+        cls._collections.inc()
+        return True
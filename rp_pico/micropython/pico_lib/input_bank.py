@@ -0,0 +1,107 @@
+from machine import Pin, Timer, mem32
+from array import array
+from micropython import const
+import uasyncio as asyncio
+
+from .logging_enhanced import Logger_Enhanced
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
+
+_GPIO_IN = const(0xd0000004)  # RP2040 SIO register GPIO_IN: input levels of GPIO 0..29
+
+class Input_Bank:
+    '''Debounced inputs on many GPIOs, sampled together by one timer.
+
+    Every sample_period ms all pins are read at once from the GPIO_IN register and debounced with
+    a 2-bit vertical counter per pin, computed bit-parallel for all pins with a few integer operations.
+    A pin changes its state after it has been stable for 4 samples.
+    The timer callback doesn't allocate memory: changed pins are written into a ring buffer and a
+    dispatcher task creates one task callback(changes) per sample with changes, a list of (pin, value).
+    '''
+    QUEUE_SIZE = 16
+
+    def __init__(self, pins, callback, pull_up_down = Pin.PULL_UP, sample_period = 5) -> None:
+        self._pins = list(pins)
+        self._callback = callback
+        self._sample_period = sample_period
+        self._mask = 0
+        for pin in self._pins:
+            Pin(pin, Pin.IN, pull_up_down)
+            self._mask |= 1 << pin
+        self._state = mem32[_GPIO_IN] & self._mask
+        # Vertical counter, bit n of _count0/_count1 is the counter of GPIO n.
+        self._count0 = self._mask
+        self._count1 = self._mask
+        # Ring buffer written by timer callback: bit masks of changed pins and state after change.
+        self._queue_changed = array('i', [0] * self.QUEUE_SIZE)
+        self._queue_states = array('i', [0] * self.QUEUE_SIZE)
+        # [0]: head (written by timer callback), [1]: tail (written by dispatcher), [2]: number of lost events.
+        self._queue_index = array('i', [0, 0, 0])
+        self._flag = asyncio.ThreadSafeFlag()
+        self._timer = None
+        self._dispatcher = None
+
+    def start(self):
+        '''Start sampling timer and dispatcher task.'''
+        _logger.debug(f'Starting input bank for GPIOs {self._pins}, sample period {self._sample_period} ms ...')
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if self._timer is None:
+            self._timer = Timer(period=self._sample_period, mode=Timer.PERIODIC, callback=self._on_timer)
+
+    def stop(self):
+        if self._timer:
+            self._timer.deinit()
+            self._timer = None
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def get_value(self, pin):
+        '''Returns debounced value of pin.'''
+        return (self._state >> pin) & 1
+
+    def get_lost_events(self):
+        '''Returns number of changes lost because the ring buffer was full.'''
+        return self._queue_index[2]
+
+    def _sample(self, value):
+        '''Debounce sample of all pins (GPIO_IN register value), returns bit mask of changed pins.'''
+        delta = (value ^ self._state) & self._mask
+        # Counters of unchanged pins are reset to 3, counters of changed pins count down; a pin toggles on roll over.
+        count0 = ~(self._count0 & delta) & self._mask
+        count1 = (count0 ^ (self._count1 & delta)) & self._mask
+        self._count0 = count0
+        self._count1 = count1
+        toggle = delta & count0 & count1
+        self._state ^= toggle
+        return toggle
+
+    def _on_timer(self, timer):
+        '''Timer callback, must not allocate memory.'''
+        changed = self._sample(mem32[_GPIO_IN])
+        if changed:
+            index = self._queue_index
+            head = index[0]
+            next_head = (head + 1) % self.QUEUE_SIZE
+            if next_head == index[1]:
+                index[2] += 1  # Ring buffer full
+                return
+            self._queue_changed[head] = changed
+            self._queue_states[head] = self._state
+            index[0] = next_head
+            self._flag.set()
+
+    async def _dispatch(self):
+        '''Dispatcher task: drain ring buffer and call callback once per batch of changed pins.'''
+        index = self._queue_index
+        while True:
+            await self._flag.wait()
+            while index[1] != index[0]:
+                tail = index[1]
+                changed = self._queue_changed[tail]
+                state = self._queue_states[tail]
+                index[1] = (tail + 1) % self.QUEUE_SIZE
+                changes = [(pin, (state >> pin) & 1) for pin in self._pins if changed & (1 << pin)]
+                _logger.debug(f'Input bank: changed pins (pin, value) {changes}.')
+                if self._callback:
+                    asyncio.create_task(self._callback(changes))
@@ -21,3 +21,141 @@ class Iso8601:
             dateTimeTuple[4], dateTimeTuple[5], dateTimeTuple[6]
         )
         return s
+
+    # Days of months (January first), February of leap years has 29.
+    _DAYS_IN_MONTH = b'\x1f\x1c\x1f\x1e\x1f\x1e\x1f\x1f\x1e\x1f\x1e\x1f'
+
+    # Length of ISO8601 string written by format...ToIsoBuffer() without and with milliseconds.
+    ISO_LENGTH = 25      # '2022-09-16T12:34:56+00:00'
+    ISO_LENGTH_MS = 29   # '2022-09-16T12:34:56.789+00:00'
+
+    @staticmethod
+    def formatTimeGmtimeToIsoBuffer(dateTimeTuple, buffer, ms = None, offset = 0) -> int:
+        """Write tuple returned by time.gmtime() as ISO8601 to bytearray/memoryview buffer.
+
+        Doesn't allocate memory. Milliseconds are written only if ms is not None.
+        Returns the number of bytes written.
+        """
+        return Iso8601._formatToBuffer(buffer, offset, dateTimeTuple[0], dateTimeTuple[1], dateTimeTuple[2],
+                                       dateTimeTuple[3], dateTimeTuple[4], dateTimeTuple[5], ms)
+
+    @staticmethod
+    def formatRtcDatetimeToIsoBuffer(dateTimeTuple, buffer, ms = None, offset = 0) -> int:
+        """Write tuple returned by rtc.datetime() as ISO8601 to bytearray/memoryview buffer.
+
+        Doesn't allocate memory. Milliseconds are written only if ms is not None.
+        Returns the number of bytes written.
+        """
+        return Iso8601._formatToBuffer(buffer, offset, dateTimeTuple[0], dateTimeTuple[1], dateTimeTuple[2],
+                                       dateTimeTuple[4], dateTimeTuple[5], dateTimeTuple[6], ms)
+
+    @staticmethod
+    def parseIsoToEpochMs(data) -> int:
+        """Parse ISO8601 bytes/str, e.g. b'2022-09-16T12:34:56.789+02:00', to ms since epoch (1970-01-01).
+
+        Fraction of seconds and time zone ('Z', '+hh:mm', '-hh:mm') are optional, no time zone means UTC.
+        Raises ValueError if data isn't a valid ISO8601 date/time.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        n = len(data)
+        if n < 19 or data[4] != 45 or data[7] != 45 or data[10] not in (84, 32) or data[13] != 58 or data[16] != 58:
+            raise ValueError('Invalid ISO8601 date/time')
+        _int = Iso8601._parseInt
+        year = _int(data, 0, 4)
+        month = _int(data, 5, 2)
+        day = _int(data, 8, 2)
+        hour = _int(data, 11, 2)
+        minute = _int(data, 14, 2)
+        second = _int(data, 17, 2)
+        if not (1 <= month <= 12 and hour <= 23 and minute <= 59 and second <= 60):
+            raise ValueError('Invalid ISO8601 date/time')
+        days_in_month = Iso8601._DAYS_IN_MONTH[month - 1]
+        if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+            days_in_month = 29
+        if not 1 <= day <= days_in_month:
+            raise ValueError('Invalid ISO8601 date/time')
+        i = 19
+        ms = 0
+        if i < n and data[i] in (46, 44):  # '.' or ','
+            i += 1
+            if i == n or not 48 <= data[i] <= 57:  # At least one digit
+                raise ValueError('Invalid ISO8601 fraction of seconds')
+            scale = 100
+            while i < n and 48 <= data[i] <= 57:
+                ms += (data[i] - 48) * scale
+                scale //= 10
+                i += 1
+        zone_minutes = 0
+        if i < n:
+            sign = data[i]
+            if sign == 90 and i + 1 == n:  # 'Z'
+                pass
+            elif sign in (43, 45) and i + 6 == n and data[i + 3] == 58:  # '+hh:mm' or '-hh:mm'
+                zone_hours = _int(data, i + 1, 2)
+                zone_minutes = _int(data, i + 4, 2)
+                if zone_hours > 23 or zone_minutes > 59:
+                    raise ValueError('Invalid ISO8601 time zone')
+                zone_minutes += zone_hours * 60
+                if sign == 45:
+                    zone_minutes = -zone_minutes
+            else:
+                raise ValueError('Invalid ISO8601 time zone')
+        # Days since 1970-01-01, see http://howardhinnant.github.io/date_algorithms.html#days_from_civil
+        y = year - 1 if month <= 2 else year
+        era = y // 400
+        yoe = y - era * 400
+        doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+        doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+        days = era * 146097 + doe - 719468
+        seconds = ((days * 24 + hour) * 60 + minute - zone_minutes) * 60 + second
+        return seconds * 1000 + ms
+
+    @staticmethod
+    def _formatToBuffer(buffer, i, year, month, day, hour, minute, second, ms) -> int:
+        start = i
+        buffer[i] = 48 + year // 1000
+        buffer[i + 1] = 48 + year // 100 % 10
+        buffer[i + 2] = 48 + year // 10 % 10
+        buffer[i + 3] = 48 + year % 10
+        buffer[i + 4] = 45  # '-'
+        buffer[i + 5] = 48 + month // 10
+        buffer[i + 6] = 48 + month % 10
+        buffer[i + 7] = 45  # '-'
+        buffer[i + 8] = 48 + day // 10
+        buffer[i + 9] = 48 + day % 10
+        buffer[i + 10] = 84  # 'T'
+        buffer[i + 11] = 48 + hour // 10
+        buffer[i + 12] = 48 + hour % 10
+        buffer[i + 13] = 58  # ':'
+        buffer[i + 14] = 48 + minute // 10
+        buffer[i + 15] = 48 + minute % 10
+        buffer[i + 16] = 58  # ':'
+        buffer[i + 17] = 48 + second // 10
+        buffer[i + 18] = 48 + second % 10
+        i += 19
+        if ms is not None:
+            buffer[i] = 46  # '.'
+            buffer[i + 1] = 48 + ms // 100
+            buffer[i + 2] = 48 + ms // 10 % 10
+            buffer[i + 3] = 48 + ms % 10
+            i += 4
+        buffer[i] = 43  # '+'
+        buffer[i + 1] = 48
+        buffer[i + 2] = 48
+        buffer[i + 3] = 58  # ':'
+        buffer[i + 4] = 48
+        buffer[i + 5] = 48
+        return i + 6 - start
+
+    @staticmethod
+    def _parseInt(data, i, length) -> int:
+        value = 0
+        end = i + length
+        while i < end:
+            digit = data[i] - 48
+            if not 0 <= digit <= 9:
+                raise ValueError('Invalid ISO8601 date/time')
+            value = value * 10 + digit
+            i += 1
+        return value
@@ -5,6 +5,12 @@ import utime
 from . import logging
 from .logging_handlers import RotatingFileHandler
 from .settings_base import Settings_Base
+from .time_service import Time_Service
+from .metrics import Metrics
+from .heap_monitor import Heap_Monitor
+
+_log_dropped = Metrics.counter('log.dropped')
+_alloc_log = Heap_Monitor.histogram('log.emit')
 
 class _Console_Logger_Settings:
     def __init__(self) -> None:
@@ -28,11 +34,14 @@ class _Settings(Settings_Base):
         self.file_logger = _File_Logger_Settings()
 
 class Formatter_Enhanced(logging.Formatter):
-    '''Override formatter from base class to customize date/time format.'''
+    '''Override formatter from base class to customize date/time format.
+
+    Uses ISO8601 date/time with ms resolution from Time_Service, e.g. '2022-09-16T12:34:56.789'.
+    '''
     def formatTime(self, record, datefmt=None):
         assert datefmt is None  # datefmt is not supported
-        ct = utime.localtime(record.created)
-        return "{0}-{1:02d}-{2:02d} {3:02d}:{4:02d}:{5:02d}".format(*ct)
+        time_ms = Time_Service.time_ms()
+        return '{}.{:03d}'.format(Time_Service.iso_prefix(time_ms // 1000), time_ms % 1000)
 
 class Logger_Enhanced(logging.Logger):
     '''Enhancements for logging'''
@@ -78,20 +87,28 @@ class Logger_Enhanced(logging.Logger):
         while dest._console_level == logging.NOTSET and dest.parent:
             dest = dest.parent
         if level >= dest._console_level:
+            start = Heap_Monitor.begin()
             record = logging.LogRecord(
                 self.name, level, None, None, msg, args, None, None, None
             )
             self._console_handler.emit(record)
+            Heap_Monitor.end(_alloc_log, start)
 
     def _log_file(self, level, msg, *args):
         dest = self
         while dest._file_level == logging.NOTSET and dest.parent:
             dest = dest.parent
         if level >= dest._file_level:
+            start = Heap_Monitor.begin()
             record = logging.LogRecord(
                 self.name, level, None, None, msg, args, None, None, None
             )
-            self._file_handler.emit(record)
+            try:
+                self._file_handler.emit(record)
+            except OSError:
+                # E.g. flash full: record is dropped, logging must not stop the application.
+                _log_dropped.inc()
+            Heap_Monitor.end(_alloc_log, start)
 
     @classmethod
     def get_logger_for_module(cls, module_name):
@@ -0,0 +1,176 @@
+from utime import ticks_ms, ticks_us, ticks_diff, ticks_add
+import uasyncio as asyncio
+
+from .metrics import Metrics
+from .logging_enhanced import Logger_Enhanced
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
+
+
+class _Profiled:
+    '''Awaitable running coro step by step (from one await to the next), each step is timed.'''
+    def __init__(self, name, coro) -> None:
+        self._name = name
+        self._coro = coro
+        self._histogram = Metrics.histogram('task.' + name + '_us', Metrics.DURATION_US)
+
+    def __iter__(self):
+        coro = self._coro
+        value = None
+        error = None
+        while True:
+            t = ticks_us()
+            try:
+                if error is None:
+                    request = coro.send(value)
+                else:
+                    request = coro.throw(error)
+            except StopIteration as stop:
+                Loop_Profiler._account(self._name, self._histogram, ticks_diff(ticks_us(), t))
+                return stop.value
+            except BaseException:
+                Loop_Profiler._account(self._name, self._histogram, ticks_diff(ticks_us(), t))
+                raise
+            Loop_Profiler._account(self._name, self._histogram, ticks_diff(ticks_us(), t))
+            value = None
+            error = None
+            try:
+                value = yield request
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as err:  # E.g. CancelledError: passed on to coro
+                error = err
+
+    __await__ = __iter__
+
+
+class _Section:
+    '''Run time of a section which isn't a task, e.g. a timer callback, recorded in interrupt context.
+
+    record() only updates an integer field (doesn't allocate), the maximum since the last pick-up is
+    accounted by Loop_Profiler from the loop.
+    '''
+    def __init__(self, name) -> None:
+        self.name = name
+        self.max_us = 0
+
+    def record(self, us):
+        if us > self.max_us:
+            self.max_us = us
+
+
+class Loop_Profiler:
+    '''Measures how long the uasyncio loop is blocked and by whom.
+
+    Tasks created with create_task(name, coro) are run step by step: the run time of every step (from
+    one await to the next, i.e. the time the task blocks the loop) is recorded in histogram
+    'task.<name>_us' (see Metrics) and the slowest steps are kept with the name of their task.
+    Sections which aren't tasks (e.g. timer callbacks) are recorded with section(name).record(us), which
+    is safe in interrupt context: the profiler picks up the slowest run per probe of the lag monitor.
+    The lag monitor is a probe task sleeping period_ms: the difference between expected and actual
+    wakeup is recorded in histogram 'loop.lag_ms'. Lags above threshold_ms are kept together with
+    the name of the slowest step since the previous probe ('unprofiled' if no profiled step explains it).
+    Recording costs a few integer operations per step, so the profiler can stay enabled in production.
+    '''
+    ENABLED = True
+    SLOWEST_COUNT = 8
+
+    _slowest = []  # (us, name) of slowest steps, descending
+    _lags = []     # (lag_ms, name) of largest lags, descending
+    _max_step_us = 0  # Slowest step since last probe of lag monitor
+    _max_step_name = None
+    _lag_histogram = Metrics.histogram('loop.lag_ms')
+    _sections = []  # _Section
+    _lag_task = None
+
+    @classmethod
+    def create_task(cls, name, coro):
+        '''Like asyncio.create_task(coro), with profiling of the task as name.'''
+        return asyncio.create_task(cls.wrap(name, coro))
+
+    @classmethod
+    def wrap(cls, name, coro):
+        '''Returns coroutine running coro with profiling as name, or coro if the profiler is disabled.'''
+        if not cls.ENABLED:
+            return coro
+        return cls._run(_Profiled(name, coro))
+
+    @classmethod
+    def section(cls, name):
+        '''Returns recorder for run times (us) of section name, call once per section, e.g. at module level.'''
+        section = _Section(name)
+        cls._sections.append(section)
+        return section
+
+    @classmethod
+    def start_lag_monitor(cls, period_ms = 100, threshold_ms = 20):
+        if cls._lag_task is None:
+            _logger.debug(f'Starting lag monitor, period {period_ms} ms, threshold {threshold_ms} ms ...')
+            cls._lag_task = asyncio.create_task(cls._lag_monitor(period_ms, threshold_ms))
+
+    @classmethod
+    def stop_lag_monitor(cls):
+        if cls._lag_task:
+            cls._lag_task.cancel()
+            cls._lag_task = None
+
+    @classmethod
+    def get_slowest(cls):
+        '''Returns list of (run time in us, name) of the slowest steps, descending.'''
+        cls._pick_up_sections()
+        return list(cls._slowest)
+
+    @classmethod
+    def get_lags(cls):
+        '''Returns list of (lag in ms, name of slowest step before) of the largest lags, descending.'''
+        return list(cls._lags)
+
+    @staticmethod
+    async def _run(profiled):
+        return await profiled
+
+    @classmethod
+    def _account(cls, name, histogram, us):
+        if histogram:
+            histogram.record(us)
+        if us > cls._max_step_us:
+            cls._max_step_us = us
+            cls._max_step_name = name
+        cls._insert(cls._slowest, us, name)
+
+    @classmethod
+    def _pick_up_sections(cls):
+        '''Account run times recorded by sections since the last call.'''
+        for section in cls._sections:
+            us = section.max_us
+            if us:
+                section.max_us = 0
+                if cls.ENABLED:
+                    cls._account(section.name, None, us)
+
+    @classmethod
+    def _insert(cls, entries, value, name):
+        '''Insert (value, name) into list sorted descending, keeping at most SLOWEST_COUNT entries.'''
+        if len(entries) >= cls.SLOWEST_COUNT and value <= entries[-1][0]:
+            return
+        i = 0
+        while i < len(entries) and entries[i][0] >= value:
+            i += 1
+        entries.insert(i, (value, name))
+        if len(entries) > cls.SLOWEST_COUNT:
+            entries.pop()
+
+    @classmethod
+    async def _lag_monitor(cls, period_ms, threshold_ms):
+        while True:
+            expected = ticks_add(ticks_ms(), period_ms)
+            await asyncio.sleep_ms(period_ms)
+            lag = ticks_diff(ticks_ms(), expected)
+            cls._lag_histogram.record(lag)
+            cls._pick_up_sections()
+            if lag > threshold_ms:
+                # Attribute lag to slowest step since last probe if it took at least half of the lag.
+                name = cls._max_step_name if cls._max_step_us * 2 >= lag * 1000 else 'unprofiled'
+                cls._insert(cls._lags, lag, name)
+            cls._max_step_us = 0
+            cls._max_step_name = None
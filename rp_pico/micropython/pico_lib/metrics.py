@@ -0,0 +1,127 @@
+import gc
+from array import array
+
+
+class _Counter:
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, n = 1):
+        self.value += n
+
+
+class _Gauge:
+    def __init__(self) -> None:
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class _Histogram:
+    '''Histogram with fixed bucket bounds: counts[i] is the number of values <= bounds[i], last bucket: > bounds[-1].'''
+    def __init__(self, bounds) -> None:
+        self.bounds = bounds
+        self.counts = array('i', [0] * (len(bounds) + 1))
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value):
+        i = 0
+        for bound in self.bounds:
+            if value <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+
+class Metrics:
+    '''Registry of runtime metrics: counters, gauges and histograms with fixed buckets.
+
+    Metrics are created once by name, e.g. at module level, and recording a value costs only a few
+    integer operations: Metrics.counter('mqtt.pkt_in').inc(), Metrics.histogram('mqtt.puback_ms').record(ms).
+    snapshot() returns all metrics as dict, e.g. to publish it (see Metrics_Exporter).
+    '''
+    LATENCY_MS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    DURATION_US = (100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000)
+
+    _metrics = {}  # name -> _Counter, _Gauge or _Histogram
+
+    @classmethod
+    def counter(cls, name):
+        '''Returns counter name, created on first call.'''
+        return cls._get(name, _Counter, None)
+
+    @classmethod
+    def gauge(cls, name):
+        '''Returns gauge name, created on first call.'''
+        return cls._get(name, _Gauge, None)
+
+    @classmethod
+    def histogram(cls, name, bounds = LATENCY_MS):
+        '''Returns histogram name with bucket bounds (ascending), created on first call.'''
+        return cls._get(name, _Histogram, bounds)
+
+    @classmethod
+    def update_heap(cls, probe_largest = False):
+        '''Update gauge heap.free, with probe_largest also heap.largest (largest block which can be allocated).
+
+        Probing is expensive: about a dozen gc.collect() and allocations of up to the whole free heap,
+        which may let allocations of other tasks fail meanwhile. Use it rarely, e.g. every n-th export.
+        '''
+        cls._collect()
+        free = gc.mem_free()
+        cls.gauge('heap.free').set(free)
+        if probe_largest:
+            cls.gauge('heap.largest').set(cls._largest_block(free))
+
+    @classmethod
+    def snapshot(cls, probe_largest = False):
+        '''Returns dict name -> value of counter/gauge or [count, sum, max, [bucket counts]] of histogram.
+
+        probe_largest: update heap.largest too (see update_heap()), otherwise it keeps its last value.
+        '''
+        cls.update_heap(probe_largest)
+        snapshot = {}
+        for name, metric in cls._metrics.items():
+            if isinstance(metric, _Histogram):
+                snapshot[name] = [metric.count, metric.sum, metric.max, list(metric.counts)]
+            else:
+                snapshot[name] = metric.value
+        return snapshot
+
+    @classmethod
+    def _get(cls, name, metric_class, bounds):
+        metric = cls._metrics.get(name)
+        if metric is None:
+            metric = metric_class(bounds) if bounds else metric_class()
+            cls._metrics[name] = metric
+        return metric
+
+    @classmethod
+    def _collect(cls):
+        '''gc.collect() counted in gc.collections (see Heap_Monitor): sections spanning it are discarded.'''
+        gc.collect()
+        cls.counter('gc.collections').inc()
+
+    @classmethod
+    def _largest_block(cls, limit):
+        '''Binary search for the largest bytearray which can be allocated (freed immediately).'''
+        low = 0
+        high = limit
+        while high - low > 64:
+            size = (low + high) // 2
+            try:
+                block = bytearray(size)
+                del block
+                cls._collect()
+                low = size
+            except MemoryError:
+                high = size
+        cls._collect()
+        return low
@@ -0,0 +1,51 @@
+import json
+import uasyncio as asyncio
+
+from .settings_base import Settings_Base
+from .metrics import Metrics
+from .logging_enhanced import Logger_Enhanced
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
+
+
+class _Settings(Settings_Base):
+    def __init__(self) -> None:
+        super().__init__()
+        self.enabled = True
+        self.topic = 'metrics/pico'
+        self.interval_secondes = 60
+        self.qos = 0
+        # Probe heap.largest every n-th export only (0: never), see Metrics.update_heap().
+        self.heap_largest_every = 0
+
+class Metrics_Exporter:
+    '''Publishes a snapshot of all metrics (see Metrics) as JSON to a topic every interval_secondes.'''
+
+    def __init__(self, client, app_settings_path = 'config/app_settings.json') -> None:
+        self._client = client
+        self._settings = _Settings()
+        self._settings.load(__name__, app_settings_path, 'metrics')
+        _logger.info(self._settings.get_settings_as_text(intro_text = f'Settings for metrics:'))
+        self._task = None
+        self._exports = 0
+
+    def start(self):
+        '''Start export task.'''
+        if self._settings.enabled and self._task is None:
+            self._task = asyncio.create_task(self._export_task())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _export_task(self):
+        while True:
+            await asyncio.sleep(self._settings.interval_secondes)
+            self._exports += 1
+            every = self._settings.heap_largest_every
+            try:
+                payload = json.dumps(Metrics.snapshot(every > 0 and self._exports % every == 0))
+                _logger.debug(f'Publishing metrics to topic \'{self._settings.topic}\': {payload}')
+                await self._client.publish(self._settings.topic, payload, False, self._settings.qos)
+            except Exception as err:
+                _logger.error(f'_export_task(): Failed to publish metrics: {err}, {type(err)}')
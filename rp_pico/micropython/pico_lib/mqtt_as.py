@@ -24,12 +24,32 @@ gc.collect()
 from micropython import const
 from machine import unique_id
 import network
+from urandom import getrandbits
 
 gc.collect()
 from sys import platform
+from .metrics import Metrics
+from .loop_profiler import Loop_Profiler
+from .heap_monitor import Heap_Monitor
+from .logging_enhanced import Logger_Enhanced
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
 
 VERSION = (0, 6, 6)
 
+# Runtime metrics, see Metrics.
+_pkt_in = Metrics.counter('mqtt.pkt_in')
+_pkt_out = Metrics.counter('mqtt.pkt_out')
+_bytes_in = Metrics.counter('mqtt.bytes_in')
+_bytes_out = Metrics.counter('mqtt.bytes_out')
+_puback_ms = Metrics.histogram('mqtt.puback_ms')
+_reconnects = Metrics.counter('mqtt.reconnects')
+_stream_errors = Metrics.counter('mqtt.stream_errors')
+_reconnect_ms = Metrics.histogram('mqtt.reconnect_ms', (500, 1000, 2000, 5000, 10000, 30000, 60000))
+_tls_handshake_ms = Metrics.histogram('mqtt.tls_handshake_ms', (50, 100, 200, 500, 1000, 2000, 5000))
+# Approximate: the sections span awaits, allocations of other tasks meanwhile are included.
+_alloc_publish = Heap_Monitor.histogram('mqtt.publish_approx')
+_alloc_receive = Heap_Monitor.histogram('mqtt.receive_approx')
+
 # Default short delay for good SynCom throughput (avoid sleep(0) with SynCom).
 _DEFAULT_MS = const(20)
 _SOCKET_POLL_DELAY = const(5)  # 100ms added greatly to publish latency
@@ -61,6 +81,8 @@ config = {
     'password':      '',
     'keepalive':     60,
     'ping_interval': 0,
+    'ping_timeout':  2,  # Time (s) to wait for a response when probing a silent link.
+    'ping_retries':  2,  # Number of unanswered probes before the link is considered dead.
     'ssl':           False,
     'ssl_params':    {},
     'response_time': 10,
@@ -73,6 +95,18 @@ config = {
     'connect_coro':  eliza,
     'ssid':          None,
     'wifi_pw':       None,
+    'low_power':     False,  # Wake up only for received data (not with ssl: polled), keepalive and link failures.
+    'wifi_pm':       None,   # RP2 WiFi power management, None: power saving off (low_power: firmware default).
+    'gc_threshold':  32768,  # gc.collect() by ._keep_connected() only if less memory is free.
+    'rx_buffer':     0,      # > 0: subs_cb gets memoryviews into a receive buffer of this size. Read-only
+                             # only where memoryview.toreadonly() exists (not on MicroPython): don't modify
+                             # or keep them.
+    'reconnect_min_ms': 250,     # Backoff for reconnects to broker while WiFi is up,
+    'reconnect_max_ms': 30000,   # doubled on every failure.
+    'sub_packet_size': 512,  # Max. size of SUBSCRIBE/UNSUBSCRIBE packets sent by .subscribe_many().
+    'tx_chunk':      256,    # Size of buffer used by .publish_stream() to write payloads from files.
+    'stream_cb':     None,   # stream_cb(topic, length, retained): returns sink for chunked payload or None.
+    'stream_chunk':  256,    # Size of buffer used to pass payload chunks to sinks of stream_cb.
 }
 
 
@@ -92,6 +126,53 @@ def qos_check(qos):
         raise ValueError('Only qos 0 and 1 are supported.')
 
 
+# Awaitable resuming when a socket is readable (or closed), without polling.
+# Uses the I/O queue of uasyncio like uasyncio's Stream.read().
+class _Readable:
+    def __init__(self, sock):
+        self._sock = sock
+
+    def __iter__(self):
+        yield asyncio.core._io_queue.queue_read(self._sock)
+
+    __await__ = __iter__
+
+
+# Payload of declared length streamed by .publish_stream() instead of being held in RAM.
+# source is a file object opened in binary mode, read with readinto() through a reusable
+# buffer and rewound to its start position on every (re)publish. Or source is a callable
+# returning an iterator of chunks, e.g. a generator function, called on every (re)publish.
+class _Payload_Stream:
+    def __init__(self, source, length, buffer):
+        self._source = source
+        self._length = length
+        self._buffer = buffer
+        self._start = source.tell() if hasattr(source, 'readinto') else None
+
+    def __len__(self):
+        return self._length
+
+    async def write(self, client):
+        remaining = self._length
+        if self._start is not None:
+            self._source.seek(self._start)
+            buf = self._buffer
+            while remaining:
+                n = self._source.readinto(buf[:min(remaining, len(buf))])
+                if not n:
+                    break
+                await client._as_write(buf, n)
+                remaining -= n
+        else:
+            for chunk in self._source():
+                if len(chunk) > remaining:
+                    raise MQTTException('Payload longer than declared length.')
+                await client._as_write(chunk)
+                remaining -= len(chunk)
+        if remaining:  # Packet is incomplete, connection must be reset.
+            raise MQTTException('Payload shorter than declared length.')
+
+
 # MQTT_base class. Handles MQTT protocol on the basis of a good connection.
 # Exceptions from connectivity failures are handled by MQTTClient subclass.
 class MQTT_base:
@@ -108,6 +189,7 @@ class MQTT_base:
             raise ValueError('invalid keepalive time')
         self._response_time = config['response_time'] * 1000  # Repub if no PUBACK received (ms).
         self._max_repubs = config['max_repubs']
+        self._sub_packet_size = config['sub_packet_size']
         self._clean_init = config['clean_init']  # clean_session state on first connection
         self._clean = config['clean']  # clean_session state on reconnect
         will = config['will']
@@ -120,8 +202,11 @@ class MQTT_base:
         self._wifi_pw = config['wifi_pw']
         self._ssl = config['ssl']
         self._ssl_params = config['ssl_params']
+        self._ssl_context = None  # Built on first TLS connection, reused on reconnect.
+        self._ssl_session = None  # TLS session of last connection, resumed on reconnect if supported.
         # Callbacks and coros
         self._cb = config['subs_cb']
+        self._stream_cb = config['stream_cb']
         self._wifi_handler = config['wifi_coro']
         self._connect_handler = config['connect_coro']
         # Network
@@ -132,13 +217,30 @@ class MQTT_base:
         if self.server is None:
             raise ValueError('no server specified.')
         self._sock = None
+        self.session_present = False  # CONNACK of last connection: broker kept the session (clean=False).
         self._sta_if = network.WLAN(network.STA_IF)
         self._sta_if.active(True)
 
         self.newpid = pid_gen()
         self.rcv_pids = set()  # PUBACK and SUBACK pids awaiting ACK response
+        self._pub_ticks = {}  # pid -> ticks_ms() of publish, for PUBACK latency
         self.last_rx = ticks_ms()  # Time of last communication from broker
+        self.last_tx = ticks_ms()  # Time of last communication to broker
         self.lock = asyncio.Lock()
+        # Zero-copy receive: PUBLISH packets fitting into the buffer are read into it and
+        # subs_cb gets memoryviews of topic and message, valid only during the callback.
+        # Views are taken from a read-only view of the buffer if the port supports it.
+        self._rx_buf = memoryview(bytearray(config['rx_buffer'])) if config['rx_buffer'] else None
+        self._rx_view = self._rx_buf
+        if self._rx_buf is not None and hasattr(self._rx_buf, 'toreadonly'):
+            self._rx_view = self._rx_buf.toreadonly()
+        self._tx_chunk = config['tx_chunk']
+        self._tx_buf = None  # Allocated on first .publish_stream() of a file.
+        self._stream_chunk = config['stream_chunk']
+        self._stream_buf = None  # Allocated on first streamed payload.
+        # Interned topics: topic length -> list of (topic, id), see .intern_topic().
+        self._topic_ids = {}
+        self._topic_count = 0
 
     def _set_last_will(self, topic, msg, retain=False, qos=0):
         qos_check(qos)
@@ -181,17 +283,45 @@ class MQTT_base:
                 msg_size = len(msg)
                 buffer[size:size + msg_size] = msg
                 size += msg_size
+                _bytes_in.inc(msg_size)
                 t = ticks_ms()
                 self.last_rx = ticks_ms()
             await asyncio.sleep_ms(_SOCKET_POLL_DELAY)
         return data
 
+    # Read n bytes into buffer (memoryview) without allocating a buffer per read.
+    async def _as_readinto(self, buffer, n):
+        sock = self._sock
+        size = 0
+        t = ticks_ms()
+        while size < n:
+            if self._timeout(t) or not self.isconnected():
+                raise OSError(-1, 'Timeout on socket read')
+            try:
+                msg_size = sock.readinto(buffer[size:n])
+            except OSError as e:  # ESP32 issues weird 119 errors here
+                msg_size = None
+                if e.args[0] not in BUSY_ERRORS:
+                    raise
+            if msg_size == 0:  # Connection closed by host
+                raise OSError(-1, 'Connection closed by host')
+            if msg_size is not None:  # data received
+                size += msg_size
+                _bytes_in.inc(msg_size)
+                t = ticks_ms()
+                self.last_rx = t
+            if size < n:
+                await asyncio.sleep_ms(_SOCKET_POLL_DELAY)
+
     async def _as_write(self, bytes_wr, length=0, sock=None):
         if sock is None:
             sock = self._sock
 
         # Wrap bytes in memoryview to avoid copying during slicing
-        bytes_wr = memoryview(bytes_wr)
+        try:
+            bytes_wr = memoryview(bytes_wr)
+        except TypeError:  # str under CPython (host emulation), MicroPython's str supports the buffer protocol
+            bytes_wr = memoryview(bytes_wr.encode())
         if length:
             bytes_wr = bytes_wr[:length]
         t = ticks_ms()
@@ -206,6 +336,8 @@ class MQTT_base:
                     raise
             if n:
                 t = ticks_ms()
+                self.last_tx = t
+                _bytes_out.inc(n)
                 bytes_wr = bytes_wr[n:]
             await asyncio.sleep_ms(_SOCKET_POLL_DELAY)
 
@@ -235,8 +367,11 @@ class MQTT_base:
         await asyncio.sleep_ms(_DEFAULT_MS)
         self.dprint('Connecting to broker.')
         if self._ssl:
-            import ussl
-            self._sock = ussl.wrap_socket(self._sock, **self._ssl_params)
+            t = ticks_ms()
+            self._sock = self._wrap_ssl(self._sock)
+            t = ticks_diff(ticks_ms(), t)
+            _tls_handshake_ms.record(t)
+            self.dprint('TLS handshake: %d ms, session resumed: %s.', t, getattr(self._sock, 'session_reused', None))
         premsg = bytearray(b"\x10\0\0\0\0\0")
         msg = bytearray(b"\x04MQTT\x04\0\0\0")  # Protocol 3.1.1
 
@@ -268,16 +403,71 @@ class MQTT_base:
         if self._user:
             await self._send_str(self._user)
             await self._send_str(self._pswd)
+        _pkt_out.inc()
         # Await CONNACK
         # read causes ECONNABORTED if broker is out; triggers a reconnect.
         resp = await self._as_read(4)
         self.dprint('Connected to broker.')  # Got CONNACK
         if resp[3] != 0 or resp[0] != 0x20 or resp[1] != 0x02:
             raise OSError(-1, 'Bad CONNACK')  # Bad CONNACK e.g. authentication fail.
+        self.session_present = bool(resp[2] & 1)
+        self.dprint('Session present: %s.', self.session_present)
+        if self._ssl:  # Handshake is complete: keep session for resumption (None on MicroPython).
+            self._ssl_session = getattr(self._sock, 'session', None)
+
+    # Wrap socket with TLS. If the ssl module provides SSLContext, the context incl.
+    # parsed certificate and key is built once and reused on every reconnect.
+    # The previous session is resumed only where the ssl module supports sessions:
+    # MicroPython's SSLSocket has no session attribute, so on the Pico only the context
+    # is reused (resumption works with the host emulation's ssl, see host_emulation).
+    # Without SSLContext ussl.wrap_socket() is called with config['ssl_params'] as before.
+    def _wrap_ssl(self, sock):
+        import ussl
+        params = self._ssl_params
+        if self._ssl_context is None:
+            if not hasattr(ussl, 'SSLContext'):
+                return ussl.wrap_socket(sock, **params)
+            ctx = ussl.SSLContext(ussl.PROTOCOL_TLS_CLIENT)
+            if hasattr(ctx, 'check_hostname'):
+                ctx.check_hostname = False
+            ctx.verify_mode = params.get('cert_reqs', ussl.CERT_NONE)
+            if params.get('cadata'):
+                ctx.load_verify_locations(cadata=params['cadata'])
+            if params.get('cert'):
+                ctx.load_cert_chain(params['cert'], params.get('key'))
+            self._ssl_context = ctx
+        kwargs = {'do_handshake_on_connect': params.get('do_handshake', True)}
+        if params.get('server_hostname'):
+            kwargs['server_hostname'] = params['server_hostname']
+        if self._ssl_session is not None:
+            kwargs['session'] = self._ssl_session
+        return self._ssl_context.wrap_socket(sock, server_side=False, **kwargs)
+
+    # Returns an id for topic (bytes or str). Received topics can then be identified with
+    # .topic_id() without allocation, e.g. by handlers getting memoryviews (config['rx_buffer']).
+    def intern_topic(self, topic):
+        if isinstance(topic, str):
+            topic = topic.encode()
+        tid = self.topic_id(topic)
+        if tid is None:
+            tid = self._topic_count
+            self._topic_count += 1
+            self._topic_ids.setdefault(len(topic), []).append((bytes(topic), tid))
+        return tid
+
+    # Returns id of interned topic (bytes, bytearray or memoryview) or None.
+    def topic_id(self, topic):
+        entries = self._topic_ids.get(len(topic))
+        if entries:
+            for interned, tid in entries:
+                if interned == topic:  # bytes on the left: compares with any buffer
+                    return tid
+        return None
 
     async def _ping(self):
         async with self.lock:
             await self._as_write(b"\xc0\0")
+            _pkt_out.inc()
 
     # Check internet connectivity by sending DNS lookup to Google's 8.8.8.8
     async def wan_ok(self,
@@ -358,6 +548,7 @@ class MQTT_base:
         pid = next(self.newpid)
         if qos:
             self.rcv_pids.add(pid)
+            self._pub_ticks[pid] = ticks_ms()
         async with self.lock:
             await self._publish(topic, msg, retain, qos, 0, pid)
         if qos == 0:
@@ -376,6 +567,7 @@ class MQTT_base:
             self.REPUB_COUNT += 1
 
     async def _publish(self, topic, msg, retain, qos, dup, pid):
+        start = Heap_Monitor.begin()
         pkt = bytearray(b"\x30\0\0\0")
         pkt[0] |= qos << 1 | retain | dup << 3
         sz = 2 + len(topic) + len(msg)
@@ -394,7 +586,12 @@ class MQTT_base:
         if qos > 0:
             struct.pack_into("!H", pkt, 0, pid)
             await self._as_write(pkt, 2)
-        await self._as_write(msg)
+        if isinstance(msg, _Payload_Stream):
+            await msg.write(self)
+        else:
+            await self._as_write(msg)
+        _pkt_out.inc()
+        Heap_Monitor.end(_alloc_publish, start)
 
     # Can raise OSError if WiFi fails. Subclass traps.
     async def subscribe(self, topic, qos):
@@ -406,6 +603,7 @@ class MQTT_base:
             await self._as_write(pkt)
             await self._send_str(topic)
             await self._as_write(qos.to_bytes(1, "little"))
+        _pkt_out.inc()
 
         if not await self._await_pid(pid):
             raise OSError(-1)
@@ -419,10 +617,67 @@ class MQTT_base:
         async with self.lock:
             await self._as_write(pkt)
             await self._send_str(topic)
+        _pkt_out.inc()
 
         if not await self._await_pid(pid):
             raise OSError(-1)
 
+    # Subscribe to a list of (topic, qos). Topic filters are packed into as few SUBSCRIBE
+    # packets as config['sub_packet_size'] allows, all packets are sent before the SUBACKs
+    # are awaited: one round trip for many subscriptions.
+    # Can raise OSError if WiFi fails. Subclass traps.
+    async def subscribe_many(self, topics):
+        await self._send_many(0x82, topics)
+
+    # Unsubscribe from a list of topics, packed like .subscribe_many().
+    # Can raise OSError if WiFi fails. Subclass traps.
+    async def unsubscribe_many(self, topics):
+        await self._send_many(0xa2, [(topic, None) for topic in topics])
+
+    # Send SUBSCRIBE (0x82) or UNSUBSCRIBE (0xa2, qos None) packets for list of (topic, qos)
+    # and await the acknowledges.
+    async def _send_many(self, op, topics):
+        topics = [(t.encode() if isinstance(t, str) else t, qos) for t, qos in topics]
+        pids = []
+        start = 0
+        while start < len(topics):
+            # Topic filters fitting into one packet, at least one.
+            sz = 2
+            end = start
+            while end < len(topics):
+                n = 2 + len(topics[end][0]) + (topics[end][1] is not None)
+                if end > start and 5 + sz + n > self._sub_packet_size:
+                    break
+                sz += n
+                end += 1
+            pkt = bytearray(5 + sz)
+            pkt[0] = op
+            i = 1
+            while sz > 0x7f:
+                pkt[i] = (sz & 0x7f) | 0x80
+                sz >>= 7
+                i += 1
+            pkt[i] = sz
+            pid = next(self.newpid)
+            struct.pack_into("!H", pkt, i + 1, pid)
+            i += 3
+            for topic, qos in topics[start:end]:
+                struct.pack_into("!H", pkt, i, len(topic))
+                pkt[i + 2:i + 2 + len(topic)] = topic
+                i += 2 + len(topic)
+                if qos is not None:
+                    pkt[i] = qos
+                    i += 1
+            self.rcv_pids.add(pid)
+            pids.append(pid)
+            async with self.lock:
+                await self._as_write(pkt, i)
+            _pkt_out.inc()
+            start = end
+        for pid in pids:
+            if not await self._await_pid(pid):
+                raise OSError(-1)
+
     # Wait for a single incoming MQTT message and process it.
     # Subscribed messages are delivered to a callback previously
     # set by .setup() method. Other (internal) MQTT
@@ -440,6 +695,8 @@ class MQTT_base:
             return
         if res == b'':
             raise OSError(-1, 'Empty response')
+        _bytes_in.inc()
+        _pkt_in.inc()
 
         if res == b"\xd0":  # PINGRESP
             await self._as_read(1)  # Update .last_rx time
@@ -454,14 +711,19 @@ class MQTT_base:
             pid = rcv_pid[0] << 8 | rcv_pid[1]
             if pid in self.rcv_pids:
                 self.rcv_pids.discard(pid)
+                t = self._pub_ticks.pop(pid, None)
+                if t is not None:
+                    _puback_ms.record(ticks_diff(ticks_ms(), t))
             else:
                 raise OSError(-1, 'Invalid pid in PUBACK packet')
 
-        if op == 0x90:  # SUBACK
-            resp = await self._as_read(4)
-            if resp[3] == 0x80:
-                raise OSError(-1, 'Invalid SUBACK packet')
-            pid = resp[2] | (resp[1] << 8)
+        if op == 0x90:  # SUBACK: pid and one return code per topic filter
+            sz = await self._recv_len()
+            resp = await self._as_read(sz)
+            for i in range(2, sz):
+                if resp[i] == 0x80:
+                    raise OSError(-1, 'Invalid SUBACK packet')
+            pid = resp[1] | (resp[0] << 8)
             if pid in self.rcv_pids:
                 self.rcv_pids.discard(pid)
             else:
@@ -477,25 +739,94 @@ class MQTT_base:
 
         if op & 0xf0 != 0x30:
             return
+        start = Heap_Monitor.begin()
         sz = await self._recv_len()
-        topic_len = await self._as_read(2)
-        topic_len = (topic_len[0] << 8) | topic_len[1]
-        topic = await self._as_read(topic_len)
-        sz -= topic_len + 2
-        if op & 6:
-            pid = await self._as_read(2)
-            pid = pid[0] << 8 | pid[1]
-            sz -= 2
-        msg = await self._as_read(sz)
+        buf = self._rx_buf
+        if buf is not None and sz <= len(buf):  # Zero-copy: read whole packet into receive buffer
+            await self._as_readinto(buf, sz)
+            view = self._rx_view
+            topic_len = (buf[0] << 8) | buf[1]
+            topic = view[2:2 + topic_len]
+            offset = 2 + topic_len
+            if op & 6:
+                pid = buf[offset] << 8 | buf[offset + 1]
+                offset += 2
+            msg = view[offset:sz]
+            sink = self._get_sink(topic, sz - offset, bool(op & 0x01))
+            if sink:  # Payload in receive buffer: delivered as one chunk.
+                self._feed(self._feed(sink, msg), None)
+        else:
+            topic_len = await self._as_read(2)
+            topic_len = (topic_len[0] << 8) | topic_len[1]
+            topic = await self._as_read(topic_len)
+            sz -= topic_len + 2
+            if op & 6:
+                pid = await self._as_read(2)
+                pid = pid[0] << 8 | pid[1]
+                sz -= 2
+            sink = self._get_sink(topic, sz, bool(op & 0x01))
+            if sink:
+                await self._read_stream(sink, sz)
+            else:
+                msg = await self._as_read(sz)
         retained = op & 0x01
-        self._cb(topic, msg, bool(retained))
+        if not sink:
+            self._cb(topic, msg, bool(retained))
+        Heap_Monitor.end(_alloc_receive, start)
         if op & 6 == 2:  # qos 1
             pkt = bytearray(b"\x40\x02\0\0")  # Send PUBACK
             struct.pack_into("!H", pkt, 2, pid)
             await self._as_write(pkt)
+            _pkt_out.inc()
         elif op & 6 == 4:  # qos 2 not supported
             raise OSError(-1, 'QoS 2 not supported')
 
+    # Read payload of n bytes chunk by chunk into a fixed buffer and pass the chunks
+    # (memoryviews valid only during the call) to sink, finally sink(None) signals the end.
+    # If the connection fails, the end is not signalled.
+    async def _read_stream(self, sink, n):
+        if self._stream_buf is None:
+            self._stream_buf = memoryview(bytearray(self._stream_chunk))
+        buf = self._stream_buf
+        while n:
+            size = min(n, len(buf))
+            await self._as_readinto(buf, size)
+            sink = self._feed(sink, buf[:size])
+            n -= size
+        self._feed(sink, None)
+
+    # Returns sink of stream_cb for received message or None. If stream_cb raises, the payload is discarded.
+    def _get_sink(self, topic, length, retained):
+        if not self._stream_cb:
+            return None
+        try:
+            return self._stream_cb(topic, length, retained)
+        except Exception as e:
+            _stream_errors.inc()
+            self._stream_error(e)
+            return self._discard
+
+    # Pass chunk (None: end of payload) to sink, returns sink for the next chunk. If the sink raises
+    # (e.g. OSError, flash full) the error is reported and the rest of the payload is drained into
+    # ._discard(): the connection isn't affected.
+    def _feed(self, sink, chunk):
+        try:
+            sink(chunk)
+        except Exception as e:
+            _stream_errors.inc()
+            self._stream_error(e)
+            return self._discard
+        return sink
+
+    # Sink discarding the payload of a stream, e.g. after the sink of stream_cb failed.
+    @staticmethod
+    def _discard(chunk):
+        pass
+
+    # Called if stream_cb or a sink raised.
+    def _stream_error(self, e):
+        _logger.error(f'Stream sink failed, payload discarded: {e}, {type(e)}')
+
 
 # MQTTClient class. Handles issues relating to connectivity.
 
@@ -508,9 +839,25 @@ class MQTTClient(MQTT_base):
         p_i = config['ping_interval'] * 1000  # Can specify shorter e.g. for subscribe-only
         if p_i and p_i < self._ping_interval:
             self._ping_interval = p_i
+        self._ping_timeout = config['ping_timeout'] * 1000
+        self._ping_retries = config['ping_retries']
         self._in_connect = False
         self._has_connected = False  # Define 'Clean Session' value to use.
         self._tasks = []
+        # Low power profile
+        self._low_power = config['low_power']
+        # Sleep until the socket is readable only without TLS: bytes already decrypted and buffered by
+        # the SSL object don't make the socket readable (no pending() on MicroPython), TLS keeps polling.
+        self._wait_readable = self._low_power and not self._ssl
+        self._wifi_pm = config['wifi_pm']
+        self._gc_threshold = config['gc_threshold']
+        self._link_down = asyncio.Event()  # Set by ._reconnect(), wakes up ._keep_connected().
+        self._wakeups = 0  # Wakeups of the client's tasks since ._wakeups_start
+        self._wakeups_start = ticks_ms()
+        self._reconnect_min = config['reconnect_min_ms']
+        self._reconnect_max = config['reconnect_max_ms']
+        self._backoff = 0  # Current backoff (ms) of broker-only reconnects, 0: no failure yet.
+        self._down_since = None  # ticks_ms() when link went down, for reconnect duration.
         if ESP8266:
             import esp
             esp.sleep_type(0)  # Improve connection integrity at cost of power consumption.
@@ -535,10 +882,14 @@ class MQTTClient(MQTT_base):
                     await asyncio.sleep(1)
         else:
             s.active(True)
-            if RP2:  # Disable auto-sleep. 
+            if RP2:  # Disable auto-sleep unless low power mode or configured otherwise.
                 # https://datasheets.raspberrypi.com/picow/connecting-to-the-internet-with-pico-w.pdf
                 # para 3.6.3
-                s.config(pm = 0xa11140)
+                pm = self._wifi_pm
+                if pm is None and not self._low_power:
+                    pm = 0xa11140
+                if pm is not None:
+                    s.config(pm = pm)
             s.connect(self._ssid, self._wifi_pw)
             for _ in range(60):  # Break out on fail or success. Check once per sec.
                 await asyncio.sleep(1)
@@ -596,6 +947,10 @@ class MQTTClient(MQTT_base):
             raise
         clean = self._clean if self._has_connected else self._clean_init
         self.rcv_pids.clear()
+        self._pub_ticks.clear()
+        if self._down_since is not None:
+            _reconnect_ms.record(ticks_diff(ticks_ms(), self._down_since))
+            self._down_since = None
         # If we get here without error broker/LAN must be up.
         self._isconnected = True
         self._in_connect = False  # Low level code can now check connectivity.
@@ -605,39 +960,71 @@ class MQTTClient(MQTT_base):
             asyncio.create_task(
                 self._keep_connected())  # Runs forever unless user issues .disconnect()
 
-        asyncio.create_task(self._handle_msg())  # Task quits on connection fail.
-        self._tasks.append(asyncio.create_task(self._keep_alive()))
+        if self._wait_readable:  # Task may wait for data on socket: must be cancelled when socket is closed.
+            self._tasks.append(Loop_Profiler.create_task('mqtt.handle_msg', self._handle_msg()))
+        else:
+            Loop_Profiler.create_task('mqtt.handle_msg', self._handle_msg())  # Task quits on connection fail.
+        self._tasks.append(Loop_Profiler.create_task('mqtt.keep_alive', self._keep_alive()))
         if self.DEBUG:
             self._tasks.append(asyncio.create_task(self._memory()))
-        asyncio.create_task(self._connect_handler(self))  # User handler.
+        asyncio.create_task(self._connect_handler(self))  # User handler, see .session_present.
 
     # Launched by .connect(). Runs until connectivity fails. Checks for and
     # handles incoming messages.
     async def _handle_msg(self):
         try:
             while self.isconnected():
+                if self._wait_readable:
+                    await _Readable(self._sock)  # Sleep until data is available
+                self._wakeups += 1
                 async with self.lock:
                     await self.wait_msg()  # Immediate return if no message
-                await asyncio.sleep_ms(_DEFAULT_MS)  # Let other tasks get lock
+                if not self._wait_readable:
+                    await asyncio.sleep_ms(_DEFAULT_MS)  # Let other tasks get lock
 
         except OSError:
             pass
         self._reconnect()  # Broker or WiFi fail.
 
     # Keep broker alive MQTT spec 3.1.2.10 Keep Alive.
-    # Runs until ping failure or no response in keepalive period.
+    # Pings are sent only if there was no traffic in one direction for a ping interval:
+    # - Nothing received: the link is probed with short timeouts, see ._probe().
+    # - Nothing sent: the broker expects a packet within the keepalive period.
+    # Runs until ping failure or no response to the probes.
     async def _keep_alive(self):
         while self.isconnected():
-            pings_due = ticks_diff(ticks_ms(), self.last_rx) // self._ping_interval
-            if pings_due >= 4:
-                self.dprint('Reconnect: broker fail.')
-                break
-            await asyncio.sleep_ms(self._ping_interval)
+            now = ticks_ms()
+            if ticks_diff(now, self.last_rx) >= self._ping_interval:
+                if not await self._probe():
+                    self.dprint('Reconnect: broker fail.')
+                    break
+            elif ticks_diff(now, self.last_tx) >= self._ping_interval:
+                try:
+                    await self._ping()
+                except OSError:
+                    break
+            # Sleep until rx or tx is silent for a ping interval.
+            now = ticks_ms()
+            silence = max(ticks_diff(now, self.last_rx), ticks_diff(now, self.last_tx))
+            await asyncio.sleep_ms(max(self._ping_interval - silence, _DEFAULT_MS))
+            self._wakeups += 1
+        self._reconnect()  # Broker or WiFi fail.
+
+    # Ping silent link until anything is received. Returns False if ._ping_retries
+    # pings are not answered within ._ping_timeout each.
+    async def _probe(self):
+        tlast = self.last_rx
+        for _ in range(self._ping_retries):
             try:
                 await self._ping()
             except OSError:
-                break
-        self._reconnect()  # Broker or WiFi fail.
+                return False
+            t = ticks_ms()
+            while ticks_diff(ticks_ms(), t) < self._ping_timeout:
+                await asyncio.sleep_ms(100)
+                if ticks_diff(self.last_rx, tlast) > 0:  # Response received
+                    return True
+        return False
 
     async def _kill_tasks(self, kill_skt):  # Cancel running tasks
         for task in self._tasks:
@@ -651,8 +1038,22 @@ class MQTTClient(MQTT_base):
     async def _memory(self):
         while True:
             await asyncio.sleep(20)
-            gc.collect()
-            self.dprint("RAM free %d alloc %d", gc.mem_free(), gc.mem_alloc())
+            Heap_Monitor.collect()
+            self.dprint("RAM free %d alloc %d high-water %d wakeups/min %d", gc.mem_free(), gc.mem_alloc(),
+                        Metrics.gauge('heap.high_water').value, self.wakeups_per_minute())
+
+    # Wakeups of the client's tasks per minute since last call.
+    def wakeups_per_minute(self):
+        now = ticks_ms()
+        elapsed = ticks_diff(now, self._wakeups_start)
+        rate = self._wakeups * 60000 // elapsed if elapsed > 0 else 0
+        self._wakeups = 0
+        self._wakeups_start = now
+        return rate
+
+    # Collect garbage only if less than config['gc_threshold'] bytes are free, see Heap_Monitor.
+    def _collect_garbage(self):
+        Heap_Monitor.collect(self._gc_threshold)
 
     def isconnected(self):
         if self._in_connect:  # Disable low-level check during .connect()
@@ -664,8 +1065,11 @@ class MQTTClient(MQTT_base):
     def _reconnect(self):  # Schedule a reconnection if not underway.
         if self._isconnected:
             self._isconnected = False
+            _reconnects.inc()
+            self._down_since = ticks_ms()
             asyncio.create_task(self._kill_tasks(True))  # Shut down tasks and socket
             asyncio.create_task(self._wifi_handler(False))  # User handler.
+            self._link_down.set()
 
     # Await broker connection.
     async def _connection(self):
@@ -676,25 +1080,43 @@ class MQTTClient(MQTT_base):
     # broker connection. Must handle conditions at edge of WiFi range.
     async def _keep_connected(self):
         while self._has_connected:
-            if self.isconnected():  # Pause for 1 second
-                await asyncio.sleep(1)
-                gc.collect()
+            if self.isconnected():
+                if self._low_power:  # Wake up on link failure or aligned with keepalive.
+                    try:
+                        await asyncio.wait_for_ms(self._link_down.wait(), self._ping_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._link_down.clear()
+                    self._wakeups += 1
+                    self._collect_garbage()
+                else:  # Pause for 1 second
+                    await asyncio.sleep(1)
+                    self._wakeups += 1
+                    self._collect_garbage()
             else:  # Link is down, socket is closed, tasks are killed
-                try:
-                    self._sta_if.disconnect()
-                except OSError:
-                    self.dprint('Wi-Fi not started, unable to disconnect interface')
-                await asyncio.sleep(1)
-                try:
-                    await self.wifi_connect()
-                except OSError:
-                    continue
+                if self._sta_if.isconnected():
+                    # Only broker / TCP connection failed: keep WiFi association and
+                    # reconnect to broker with exponential backoff and jitter.
+                    delay = self._next_backoff()
+                    self.dprint('Broker connection failed, WiFi is up. Reconnecting in %d ms.', delay)
+                    await asyncio.sleep_ms(delay)
+                else:
+                    try:
+                        self._sta_if.disconnect()
+                    except OSError:
+                        self.dprint('Wi-Fi not started, unable to disconnect interface')
+                    await asyncio.sleep(1)
+                    try:
+                        await self.wifi_connect()
+                    except OSError:
+                        continue
                 if not self._has_connected:  # User has issued the terminal .disconnect()
                     self.dprint('Disconnected, exiting _keep_connected')
                     break
                 try:
                     await self.connect()
                     # Now has set ._isconnected and scheduled _connect_handler().
+                    self._backoff = 0
                     self.dprint('Reconnect OK!')
                 except OSError as e:
                     self.dprint('Error in reconnect. %s', e)
@@ -704,6 +1126,13 @@ class MQTTClient(MQTT_base):
                     self._isconnected = False
         self.dprint('Disconnected, exited _keep_connected')
 
+    # Returns delay (ms) before next broker-only reconnect: backoff doubled on every
+    # failure, randomized to [backoff / 2, backoff] so clients don't reconnect in sync.
+    def _next_backoff(self):
+        self._backoff = min(self._backoff * 2, self._reconnect_max) if self._backoff else self._reconnect_min
+        half = self._backoff // 2
+        return half + getrandbits(16) % (half + 1)
+
     async def subscribe(self, topic, qos=0):
         qos_check(qos)
         while 1:
@@ -723,6 +1152,26 @@ class MQTTClient(MQTT_base):
                 pass
             self._reconnect()  # Broker or WiFi fail.
 
+    async def subscribe_many(self, topics):
+        for _, qos in topics:
+            qos_check(qos)
+        while 1:
+            await self._connection()
+            try:
+                return await super().subscribe_many(topics)
+            except OSError:
+                pass
+            self._reconnect()  # Broker or WiFi fail.
+
+    async def unsubscribe_many(self, topics):
+        while 1:
+            await self._connection()
+            try:
+                return await super().unsubscribe_many(topics)
+            except OSError:
+                pass
+            self._reconnect()  # Broker or WiFi fail.
+
     async def publish(self, topic, msg, retain=False, qos=0):
         qos_check(qos)
         while 1:
@@ -731,4 +1180,22 @@ class MQTTClient(MQTT_base):
                 return await super().publish(topic, msg, retain, qos)
             except OSError:
                 pass
+            self._reconnect()  # Broker or WiFi fail.
+
+    # Publish payload of length bytes from a file object or a callable returning an iterator
+    # of chunks (see _Payload_Stream), without loading it into RAM.
+    async def publish_stream(self, topic, source, length, retain=False, qos=0):
+        qos_check(qos)
+        if self._tx_buf is None and hasattr(source, 'readinto'):
+            self._tx_buf = memoryview(bytearray(self._tx_chunk))
+        msg = _Payload_Stream(source, length, self._tx_buf)
+        while 1:
+            await self._connection()
+            try:
+                return await super().publish(topic, msg, retain, qos)
+            except OSError:
+                pass
+            except MQTTException:
+                self._reconnect()  # Incomplete packet sent.
+                raise
             self._reconnect()  # Broker or WiFi fail.
\ No newline at end of file
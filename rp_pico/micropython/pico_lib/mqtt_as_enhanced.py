@@ -1,16 +1,23 @@
 import re
+import uos
+from utime import ticks_us, ticks_diff
 import uasyncio as asyncio
 
 from .mqtt_as import MQTTClient, config
 from .settings_base import Settings_Base
+from .metrics import Metrics
 from .logging_enhanced import Logger_Enhanced
 _logger =  Logger_Enhanced.get_logger_for_module(__name__) 
 
+_handler_us = Metrics.histogram('mqtt.handler_us', Metrics.DURATION_US)
+
 class _Wifi_Settings(Settings_Base):
     def __init__(self) -> None:
         super().__init__()
         self.ssid = ''
         self.password = ''
+        # RP2 WiFi power management (see wifi.config(pm)), None: power saving off, unless low_power is set.
+        self.pm = None
 
 class _Mqtt_Settings(Settings_Base):
     def __init__(self) -> None:
@@ -23,6 +30,20 @@ class _Mqtt_Settings(Settings_Base):
         self.password = ''
         self.client_cert_file_path = ''
         self.private_key_file_path = ''
+        # Opt-in low power profile: tasks wake up only for received data, keepalive and link failures.
+        # With use_ssl received data is still polled: buffered TLS data doesn't make the socket readable.
+        self.low_power = False
+        # > 0: messages up to this size are passed to handlers as memoryviews (zero-copy), see mqtt_as.
+        # Only with inbound_queue_size = 0. On MicroPython the views are writable: don't modify or keep them.
+        self.rx_buffer_size = 0
+        # > 0: received messages are put into a queue of this size and handlers are called by
+        # inbound_dispatchers tasks. 0: handlers are called while receiving (before PUBACK is sent).
+        # Trade-off: queued messages are copied (bytes), so with a queue handlers don't get the
+        # zero-copy memoryviews of rx_buffer_size. Use the queue for slow or async handlers.
+        self.inbound_queue_size = 0
+        self.inbound_dispatchers = 1
+        # Policy if inbound queue is full: 'drop_oldest' or 'drop_newest' message.
+        self.inbound_overflow = 'drop_oldest'
 
 class MQTTClient_enhanced(MQTTClient):
 
@@ -42,8 +63,22 @@ class MQTTClient_enhanced(MQTTClient):
 
         # dict: subscribed topic (may include # and +) -> handler
         self._topic_to_handler = dict()
+        # dict: subscribed topic (may include # and +) -> qos, subscriptions are restored on reconnect.
+        self._topic_to_qos = dict()
         # dict: subscribed topic (may include # and +) -> subscribed topic as regex (compiled)
         self._topic_to_regex = dict()
+        # dict: id of interned topic (see intern_topic()) -> list of handlers, cache filled on first message.
+        self._topic_id_to_handlers = dict()
+        # dict: topic subscribed with subscribe_stream() -> (topic as regex (compiled), stream handler)
+        self._topic_to_stream_handler = dict()
+
+        # Inbound queue: list of (topic, msg, retained), None if handlers are called while receiving.
+        self._inbound_queue = [] if self._mqtt_settings.inbound_queue_size > 0 else None
+        self._inbound_event = asyncio.Event()
+        self._inbound_dispatchers = []
+        self._inbound_max_depth = 0
+        self._inbound_dropped = 0
+        self._inbound_dispatched = 0
 
         # config[] is defined as global variable in mqtt_as, here we change only some values.
         config = self._init_config_of_mqtt_client()
@@ -60,6 +95,9 @@ class MQTTClient_enhanced(MQTTClient):
         config['user'] = mqtt.username
         config['password'] = mqtt.password
         config['ssl'] = mqtt.use_ssl
+        config['low_power'] = mqtt.low_power
+        config['wifi_pm'] = wifi.pm
+        config['rx_buffer'] = mqtt.rx_buffer_size
         if mqtt.use_ssl:
             _logger.debug(f'Loading client certificate/key: {mqtt.client_cert_file_path}/{mqtt.private_key_file_path}.')
             with open(mqtt.client_cert_file_path, 'rb') as f:
@@ -72,9 +110,13 @@ class MQTTClient_enhanced(MQTTClient):
         config['wifi_coro'] = self._on_connection_state_changed
         config['connect_coro'] = self._on_connection_established
         config['subs_cb'] = self._on_message_received
+        config['stream_cb'] = self._on_stream_received
         return config
 
     async def connect(self, check_connection = True):
+        if self._inbound_queue is not None and not self._inbound_dispatchers:
+            for _ in range(self._mqtt_settings.inbound_dispatchers):
+                self._inbound_dispatchers.append(asyncio.create_task(self._inbound_dispatcher()))
         try:
             _logger.info('Connecting to broker ...')
             await super().connect(quick = check_connection)
@@ -94,45 +136,186 @@ class MQTTClient_enhanced(MQTTClient):
 
     def get_host(self):
         return self._mqtt_settings.host
+
+    def get_inbound_queue_metrics(self):
+        '''Returns dict with current and max. depth of inbound queue, number of dropped and dispatched messages.'''
+        return {
+            'depth': len(self._inbound_queue) if self._inbound_queue is not None else 0,
+            'max_depth': self._inbound_max_depth,
+            'dropped': self._inbound_dropped,
+            'dispatched': self._inbound_dispatched,
+        }
     
     async def _on_connection_established(self, client):
-        _logger.info(f"_on_broker_connected(): Connection to MQTT broker '{client.server}', port {client.port} established.")
+        _logger.info(f"_on_broker_connected(): Connection to MQTT broker '{client.server}', port {client.port} established, session present: {client.session_present}.")
+        if client.session_present:
+            # Persistent session (use_clean_session = false): the broker still holds the subscriptions.
+            _logger.info(f'Broker kept session, {len(self._topic_to_qos)} subscription(s) not restored.')
+        elif self._topic_to_qos:
+            _logger.info(f'Restoring {len(self._topic_to_qos)} subscription(s) ...')
+            await super().subscribe_many(list(self._topic_to_qos.items()))
         if self._connection_established_handler:
             await self._connection_established_handler(client)
         else:
             _logger.warning("No 'connection established handler' registered!")
 
-    async def subscribe(self, topic, handler):
-        _logger.info(f'Subscribing for topic \'{topic}\' ...')
-        if topic in self._topic_to_handler:
-            del self._topic_to_handler[topic]
-            await super().unsubscribe(topic)
-        self._topic_to_handler[topic] = handler
-        self._topic_to_regex[topic] = self._compile_regex(topic)
-        await super().subscribe(topic)
+    async def subscribe(self, topic, handler, qos = 0):
+        '''Subscribe topic, the subscription is restored on reconnect.
+
+        If topic is already subscribed with the same qos only the handler is replaced, without broker round trip.
+        '''
+        await self.subscribe_many([(topic, handler)], qos)
+
+    async def subscribe_many(self, topics, qos = 0):
+        '''Subscribe list of (topic, handler) with as few SUBSCRIBE packets as possible.'''
+        new_topics = []
+        for topic, handler in topics:
+            if self._topic_to_qos.get(topic) != qos:
+                _logger.info(f'Subscribing for topic \'{topic}\' ...')
+                new_topics.append((topic, qos))
+            self._topic_to_handler[topic] = handler
+            self._topic_to_regex[topic] = self._compile_regex(topic)
+        self._topic_id_to_handlers.clear()
+        if new_topics:
+            await super().subscribe_many(new_topics)
+            for topic, qos in new_topics:
+                self._topic_to_qos[topic] = qos
+
+    async def unsubscribe_many(self, topics):
+        '''Unsubscribe list of topics with as few UNSUBSCRIBE packets as possible.'''
+        for topic in topics:
+            self._topic_to_handler.pop(topic, None)
+            self._topic_to_regex.pop(topic, None)
+            self._topic_to_stream_handler.pop(topic, None)
+            self._topic_to_qos.pop(topic, None)
+        self._topic_id_to_handlers.clear()
+        await super().unsubscribe_many(topics)
+
+    async def unsubscribe(self, topic):
+        await self.unsubscribe_many([topic])
+
+    async def subscribe_stream(self, topic, handler, qos = 0):
+        '''Subscribe topic, payloads of its messages are delivered in chunks, e.g. to write them to a file.
+
+        For every message handler(topic, length, retained) is called with the decoded topic and the payload
+        length. It returns a sink (callable) or None to discard the payload. sink(chunk) is called with
+        chunks of the payload (memoryviews into a fixed buffer, valid only during the call), finally sink(None).
+        If the connection fails sink(None) isn't called. Handler and sink are called while receiving.
+        If the sink raises (e.g. OSError, flash full), the error is logged and the rest of the payload is
+        discarded without calling the sink again. The connection isn't affected.
+        '''
+        self._topic_to_stream_handler[topic] = (self._compile_regex(topic), handler)
+        if self._topic_to_qos.get(topic) != qos:
+            _logger.info(f'Subscribing for topic \'{topic}\' (stream) ...')
+            await super().subscribe(topic, qos)
+            self._topic_to_qos[topic] = qos
+
+    async def publish_file(self, topic, path, retain = False, qos = 1):
+        '''Publish content of file (e.g. rotated log file) as payload, streamed from flash through a small buffer.'''
+        length = uos.stat(path)[6]
+        _logger.info(f'Publishing file \'{path}\' ({length} bytes) to topic \'{topic}\' ...')
+        with open(path, 'rb') as file:
+            await self.publish_stream(topic, file, length, retain, qos)
 
     def dprint(self, msg, *args):
         '''Override dprint() of MQTT_base class in module mqtt_as to use logger.'''
         if self.DEBUG:
             _logger.info('mqtt_as: ' + (msg % args))
 
+    def _on_stream_received(self, topic, length, retained):
+        '''Called by mqtt_as for every received message: returns sink of matching stream handler or None.'''
+        if not self._topic_to_stream_handler:
+            return None
+        topic_str = bytes(topic).decode()
+        for regex, handler in self._topic_to_stream_handler.values():
+            if regex.match(topic_str):
+                _logger.debug(f'Streaming {length} bytes for topic \'{topic_str}\' to handler \'{handler.__name__}()\' ...')
+                try:
+                    sink = handler(topic_str, length, retained)
+                except Exception as err:
+                    _logger.error(f'_on_stream_received(): Unexpected {err}, {type(err)}')
+                    sink = None
+                return sink if sink else self._discard
+        return None
+
     def _on_message_received(self, topic, msg, retained):
+        '''Called by mqtt_as for every received message: call handlers or put message into inbound queue.'''
+        queue = self._inbound_queue
+        if queue is None:
+            # Handlers are called now, async handlers are run as tasks.
+            for coro in self._call_handlers(topic, msg, retained):
+                asyncio.create_task(coro)
+            return
+        if len(queue) >= self._mqtt_settings.inbound_queue_size:
+            self._inbound_dropped += 1
+            if self._mqtt_settings.inbound_overflow == 'drop_newest':
+                return
+            queue.pop(0)
+        # Topic and message are copied, memoryviews (setting rx_buffer_size) are only valid during this call.
+        queue.append((bytes(topic), bytes(msg), retained))
+        if len(queue) > self._inbound_max_depth:
+            self._inbound_max_depth = len(queue)
+        self._inbound_event.set()
+
+    async def _inbound_dispatcher(self):
+        '''Dispatcher task: call handlers for messages in inbound queue, awaiting async handlers.'''
+        queue = self._inbound_queue
+        while True:
+            while not queue:
+                self._inbound_event.clear()
+                await self._inbound_event.wait()
+            topic, msg, retained = queue.pop(0)
+            self._inbound_dispatched += 1
+            for coro in self._call_handlers(topic, msg, retained):
+                try:
+                    await coro
+                except Exception as err:
+                    _logger.error(f'_inbound_dispatcher(): Unexpected {err}, {type(err)}')
+
+    def _call_handlers(self, topic, msg, retained):
+        '''Call handlers of subscriptions matching topic, returns coroutines returned by async handlers.
+
+        topic and msg are bytearrays or, with setting rx_buffer_size, memoryviews valid only during the call.
+        For interned topics (see intern_topic()) the matching handlers are cached and called without
+        decoding the topic, i.e. without allocating memory.
+        '''
+        coros = ()
         try:
-            _logger.info(f'Received message for topic: \'{topic.decode()}\' Message: \'{msg.decode()}\' Retained: {retained}')
-            topic_patterns = self._find_matching_topic_patterns(topic.decode())
+            topic_id = self.topic_id(topic)
+            handlers = self._topic_id_to_handlers.get(topic_id) if topic_id is not None else None
+            if handlers is not None:
+                for handler in handlers:
+                    t = ticks_us()
+                    ret = handler(topic, msg, retained)
+                    _handler_us.record(ticks_diff(ticks_us(), t))
+                    if hasattr(ret, 'send'):  # Async handler
+                        coros = coros + (ret,)
+                return coros
+            topic_str = bytes(topic).decode()
+            _logger.info(f'Received message for topic: \'{topic_str}\' Message: \'{bytes(msg).decode()}\' Retained: {retained}')
+            topic_patterns = self._find_matching_topic_patterns(topic_str)
+            handlers = []
             if topic_patterns:
                 for tp in topic_patterns:
                     handler = self._topic_to_handler[tp]
                     if handler:
-                        _logger.debug(f'Calling subscription handler \'{handler.__name__}()\' for topic \'{topic.decode()}\' ...')
+                        handlers.append(handler)
+                        _logger.debug(f'Calling subscription handler \'{handler.__name__}()\' for topic \'{topic_str}\' ...')
+                        t = ticks_us()
                         ret = handler(topic, msg, retained)
+                        _handler_us.record(ticks_diff(ticks_us(), t))
+                        if hasattr(ret, 'send'):  # Async handler
+                            coros = coros + (ret,)
                         _logger.debug(f'Subscription handler \'{handler.__name__}()\' returned with \'{ret}\'.')
                     else:
-                        _logger.error(f'Found no subscription handler topic for topic \'{topic.decode()}\'.')
+                        _logger.error(f'Found no subscription handler topic for topic \'{topic_str}\'.')
             else:
-                _logger.error(f'Found no subscription for topic \'{topic.decode()}\'.')
+                _logger.error(f'Found no subscription for topic \'{topic_str}\'.')
+            if topic_id is not None:
+                self._topic_id_to_handlers[topic_id] = handlers
         except BaseException as err:
-            _logger.error(f'_on_message_received(): Unexpected {err}, {type(err)}')
+            _logger.error(f'_call_handlers(): Unexpected {err}, {type(err)}')
+        return coros
 
     async def _on_connection_state_changed(self, state):
         if state:
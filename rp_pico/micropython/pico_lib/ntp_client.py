@@ -1,5 +1,6 @@
 import struct
 import time
+from utime import ticks_ms, ticks_diff
 import machine
 import uasyncio as asyncio
 
@@ -7,19 +8,35 @@ from .settings_base import Settings_Base
 from .networking import Network_Utilities
 from .udp_client import Udp_Client
 from .iso8601 import Iso8601
+from .time_service import Time_Service
+from .loop_profiler import Loop_Profiler
 from .logging_enhanced import Logger_Enhanced
-_logger =  Logger_Enhanced.get_logger_for_module(__name__) 
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
 
 
 class _Settings(Settings_Base):
     def __init__(self) -> None:
         super().__init__()
         self.host = 'time.google.com'
+        # Initial interval, adapted between min_interval_secondes and max_interval_secondes depending on clock drift.
         self.interval_secondes = 3600 * 6
+        self.min_interval_secondes = 600
+        self.max_interval_secondes = 3600 * 24
+        # Number of NTP requests per synchronization, the response with the lowest round-trip delay is used.
+        self.samples = 4
+        # Interval is doubled if the clock offset found at synchronization is within this limit, otherwise halved.
+        self.max_offset_ms = 10
+        self.timeout_ms = 1000
 
 class Ntp_Client:
+    '''SNTP client (RFC 4330) synchronizing Pico's RTC.
+
+    Each synchronization sends several requests and keeps the sample with the lowest round-trip delay.
+    The server time is compensated by half the round-trip delay and anchored to ticks_ms() in
+    Time_Service. The drift of the local clock is estimated from consecutive synchronizations, it is
+    compensated by Time_Service and used to adapt the synchronization interval.
+    '''
     NTP_PORT = 123
-    NTP_QUERY = '\x1b' + 47*'\0'
     NTP_EPOCH = 2208988800
 
     def __init__(self, settings_file_path = 'config/app_settings.json') -> None:
@@ -27,33 +44,111 @@ class Ntp_Client:
         self._settings.load(__name__, settings_file_path, 'ntp')
         _logger.info(self._settings.get_settings_as_text(intro_text = f'Settings for {type(self)}:'))
         self._udp = Udp_Client()
+        self._interval = self._settings.interval_secondes
+        self._request_count = 0  # Makes transmit timestamps unique, see _query()
+
+    def get_interval(self):
+        return self._interval
 
     async def synch_time(self):
         _logger.debug(f'Getting time from NTP server ...')
         addr = Network_Utilities.get_address(self._settings.host, self.NTP_PORT)
-        response = await self._udp.send_and_receive(self.NTP_QUERY, 48, addr[0], self.NTP_PORT)
-        if response:
-            val = struct.unpack("!I", response[40:44])[0]
-            t = val - self.NTP_EPOCH
-            tm = time.gmtime(t)
-            rtc = machine.RTC()
-            oldTime = rtc.datetime()
-            # Set date/time of Pico's RTC
-            rtc.datetime((tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0))
-            _logger.info(f"Synchronized RTC with NTP server '{self._settings.host}', datetime = {Iso8601.formatTimeGmtimeToIso(tm)}.")
-            _logger.debug(f'rtc.datetime() before sync = {Iso8601.formatRtcDatetimeToIso(oldTime)}.')
-            _logger.debug(f'rtc.datetime() after sync  = {Iso8601.formatRtcDatetimeToIso(rtc.datetime())}.')
-            _logger.debug(f'time.gmtime()  after sync  = {Iso8601.formatTimeGmtimeToIso(time.gmtime())}.')
-        else:
+        if not addr:
+            _logger.error(f"Failed to get time from NTP server '{self._settings.host}'.")
+            return False
+        best = None
+        for _ in range(self._settings.samples):
+            sample = await self._query(addr[0])
+            if sample and (best is None or sample[2] < best[2]):
+                best = sample
+        if best is None:
             _logger.error(f"Failed to get time from NTP server '{self._settings.host}'.")
+            return False
+        self._discipline(*best)
+        await self._set_rtc()
+        return True
+
+    async def _query(self, ip):
+        '''Send one SNTP request, returns (ticks, time_ms, delay_ms) or None.
+
+        time_ms is the server time at ticks_ms() == ticks, compensated by half the round-trip delay.
+        '''
+        request = bytearray(48)
+        request[0] = 0x23  # LI = 0, VN = 4, mode = 3 (client)
+        t1 = ticks_ms()
+        # Transmit timestamp is echoed by the server as originate timestamp, it identifies the response.
+        # Before the first synchronization time_ms() has 1 s resolution: the low 16 bits of the fraction
+        # (< 16 us) hold a request counter, so a late response can't match a later request of the same second.
+        ntp_ms = Time_Service.time_ms(t1) + self.NTP_EPOCH * 1000
+        self._request_count = (self._request_count + 1) & 0xffff
+        fraction = (((ntp_ms % 1000) << 32) // 1000) & 0xffff0000 | self._request_count
+        struct.pack_into('!II', request, 40, ntp_ms // 1000, fraction)
+        key = bytes(request[40:48])
+        response = await self._udp.send_and_receive(request, 48, ip, self.NTP_PORT, key = key, key_of = self._key_of,
+                                                     timeout_ms = self._settings.timeout_ms, max_send_retries = 1)
+        t4 = ticks_ms()
+        if not response or len(response) < 48:
+            return None
+        if response[0] & 0x07 != 4 or response[1] == 0:  # Not a server response or kiss-o'-death packet.
+            _logger.warning(f'_query(): Invalid response from NTP server, mode {response[0] & 0x07}, stratum {response[1]}.')
+            return None
+        t2 = self._ntp_to_ms(response, 32)  # Receive timestamp (server)
+        t3 = self._ntp_to_ms(response, 40)  # Transmit timestamp (server)
+        delay = max(0, ticks_diff(t4, t1) - (t3 - t2))
+        _logger.debug(f'_query(): Round-trip delay {delay} ms.')
+        return (t4, t3 + delay // 2, delay)
+
+    def _discipline(self, ticks, time_ms, delay):
+        '''Update anchor, drift estimate and synchronization interval with new sample.'''
+        drift_ppm = 0
+        anchor = Time_Service.get_anchor()
+        if anchor:
+            drift_ppm = anchor[2]
+            offset = time_ms - Time_Service.time_ms(ticks)
+            # Time since last synchronization: the anchor may have been moved forward by Time_Service.
+            elapsed = time_ms - Time_Service.get_synchronized_ms()
+            if elapsed > 0:
+                # Offset is the error of the time compensated with drift_ppm since last synchronization.
+                measured_drift_ppm = drift_ppm + offset * 1000000 // elapsed
+                drift_ppm = (drift_ppm + measured_drift_ppm) // 2 if drift_ppm else measured_drift_ppm
+            if abs(offset) <= self._settings.max_offset_ms:
+                self._interval = min(self._interval * 2, self._settings.max_interval_secondes)
+            else:
+                self._interval = max(self._interval // 2, self._settings.min_interval_secondes)
+            _logger.info(f'Clock offset {offset} ms, delay {delay} ms, drift {drift_ppm} ppm, next synchronization in {self._interval} s.')
+        Time_Service.set_anchor(ticks, time_ms, drift_ppm)
+
+    async def _set_rtc(self):
+        '''Set RTC at the next full second, because the RTC has no sub-second resolution.'''
+        rtc = machine.RTC()
+        oldTime = rtc.datetime()
+        await asyncio.sleep_ms(1000 - Time_Service.time_ms() % 1000)
+        tm = time.gmtime(Time_Service.time_ms() // 1000)
+        # Set date/time of Pico's RTC
+        rtc.datetime((tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0))
+        _logger.info(f"Synchronized RTC with NTP server '{self._settings.host}', datetime = {Iso8601.formatTimeGmtimeToIso(tm)}.")
+        _logger.debug(f'rtc.datetime() before sync = {Iso8601.formatRtcDatetimeToIso(oldTime)}.')
+        _logger.debug(f'rtc.datetime() after sync  = {Iso8601.formatRtcDatetimeToIso(rtc.datetime())}.')
+        _logger.debug(f'time.gmtime()  after sync  = {Iso8601.formatTimeGmtimeToIso(time.gmtime())}.')
+
+    @classmethod
+    def _ntp_to_ms(cls, data, offset):
+        '''Convert NTP timestamp (seconds, fraction) at offset in data to ms since epoch (1970-01-01).'''
+        seconds, fraction = struct.unpack_from('!II', data, offset)
+        return (seconds - cls.NTP_EPOCH) * 1000 + ((fraction * 1000) >> 32)
+
+    @staticmethod
+    def _key_of(response):
+        '''Originate timestamp of response, i.e. transmit timestamp of request.'''
+        return bytes(response[24:32])
 
     async def start_synch_task(self):
         '''Start task to synchonize periodically Pico's RTC with NTP server.'''
         try:
-            # The first synchronization must be performed immediately (i.e. synchronously) to ensure 
+            # The first synchronization must be performed immediately (i.e. synchronously) to ensure
             # that the RTC is synchronized as quickly as possible.
             await self.synch_time()
-            asyncio.create_task(self._synch_task())
+            Loop_Profiler.create_task('ntp.synch_task', self._synch_task())
         except BaseException as err:
             _logger.error(f'Failed to start synch task: {err}, {type(err)}')
             raise
@@ -61,8 +156,15 @@ class Ntp_Client:
     async def _synch_task(self):
         '''Synchronize periodically RTC with NTP server.'''
         while True:
-            await asyncio.sleep(self._settings.interval_secondes)
+            # Sleep in steps: Time_Service.time_ms() must be called at least every ~3 days, see there.
+            remaining = self._interval
+            while remaining > 0:
+                step = min(remaining, 86400)
+                await asyncio.sleep(step)
+                remaining -= step
+                Time_Service.time_ms()
             try:
-                await self.synch_time()
+                if not await self.synch_time():
+                    self._interval = max(self._interval // 2, self._settings.min_interval_secondes)
             except Exception as err:
                 _logger.error(f"_synch_task(): Unexpected error while synchronizing with NTP server '{self._settings.host}': {err}, {type(err)}")
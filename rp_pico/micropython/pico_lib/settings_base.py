@@ -1,5 +1,9 @@
 import json
 
+from .heap_monitor import Heap_Monitor
+
+_alloc_load = Heap_Monitor.histogram('settings.load')
+
 class Settings_Base:
     '''Base class for settings / configuration class.
     
@@ -18,6 +22,7 @@ class Settings_Base:
         settings_file_path : String or list of strings with paths of files to load.
         json_path : Path of JSON node where mapping starts (default = root node(s)).
         '''
+        start = Heap_Monitor.begin()
         # Allow single path as string or several paths as list of strings.
         if not isinstance(settings_file_paths, list):
             settings_file_paths = [settings_file_paths]
@@ -31,6 +36,7 @@ class Settings_Base:
             except Exception as e:
                 print(f'Error while reading {settings_file_path}: {e}')
                 raise
+        Heap_Monitor.end(_alloc_load, start)
 
     def get_settings_as_text(self, intro_text, prefix = '', obj = None):
         '''Returns all public attributes and their values (of derived class object) as formatted text.'''
@@ -43,10 +49,10 @@ class Settings_Base:
         keys = sorted(obj.__dict__.keys())
         for key in [k for k in keys if k[0] != '_']:
             value = getattr(obj, key)
-            if type(value) in [str, int, bool, list]:
+            if value is None or type(value) in [str, int, float, bool, list]:
                 # For password fields: Return only stars (*). 
                 for pwd in self._password_fields:
-                    if pwd.lower() in key.lower():
+                    if pwd.lower() in key.lower() and isinstance(value, str):
                         value = '*' * len(value)
                 text.append(f'  {prefix}{key} = {value}')
             else:
@@ -0,0 +1,117 @@
+from utime import ticks_ms, ticks_diff
+import uasyncio as asyncio
+
+from .logging_enhanced import Logger_Enhanced
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
+
+# Indexes into list kept per topic.
+_VALUE = 0
+_DIRTY = 1
+_IMMEDIATE = 2
+_LAST_SENT = 3
+_COALESCED = 4
+
+class State_Publisher:
+    '''Publishes the latest state per topic with a max. rate per topic.
+
+    publish() only stores the value, a single sender task publishes it via the MQTT client.
+    Per topic a value is published at most every min_interval_ms: the first change after a quiet period
+    is sent immediately, changes within the interval are coalesced and only the latest value is sent
+    when the interval has elapsed. Values published with immediate = True are sent without waiting for
+    the interval. So broker traffic and RAM (one value per topic, one publish in flight) are bounded
+    for noisy inputs.
+    '''
+
+    def __init__(self, client, min_interval_ms = 250, qos = 1, retain = False) -> None:
+        self._client = client
+        self._min_interval = min_interval_ms
+        self._qos = qos
+        self._retain = retain
+        self._topics = {}  # dict: topic -> [value, dirty, immediate, last_sent, coalesced]
+        self._coalesced = 0
+        self._event = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        '''Start sender task.'''
+        if self._task is None:
+            _logger.debug(f'Starting state publisher task, min. interval {self._min_interval} ms ...')
+            self._task = asyncio.create_task(self._send_task())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, topic, value, immediate = False):
+        '''Set latest value of topic, it is published by the sender task.'''
+        entry = self._topics.get(topic)
+        if entry is None:
+            self._topics[topic] = [value, True, immediate, None, 0]
+        else:
+            if entry[_DIRTY]:
+                # Previous value hasn't been sent yet, it is replaced.
+                entry[_COALESCED] += 1
+                self._coalesced += 1
+            entry[_VALUE] = value
+            entry[_DIRTY] = True
+            entry[_IMMEDIATE] = entry[_IMMEDIATE] or immediate
+        self._event.set()
+
+    def get_coalesced_count(self, topic = None):
+        '''Returns number of values replaced before they have been sent, for topic or all topics.'''
+        if topic is None:
+            return self._coalesced
+        entry = self._topics.get(topic)
+        return entry[_COALESCED] if entry else 0
+
+    def _next_topic(self, now):
+        '''Returns (topic, None) of a topic to send now or (None, ms until next topic is due).
+
+        last_sent is reset to None when the interval has elapsed (the task wakes up for it), so the
+        next change of an idle topic is sent immediately without comparing ticks of long ago.
+        '''
+        wait = None
+        for topic, entry in self._topics.items():
+            last_sent = entry[_LAST_SENT]
+            if last_sent is not None:
+                remaining = self._min_interval - ticks_diff(now, last_sent)
+                # remaining > interval: ticks_diff() is negative, the task was blocked for more than
+                # 2^29 ms (~6.2 days) by publish().
+                if remaining <= 0 or remaining > self._min_interval:
+                    entry[_LAST_SENT] = last_sent = None
+            if not entry[_DIRTY]:
+                if last_sent is not None and (wait is None or remaining < wait):
+                    wait = remaining
+                continue
+            if entry[_IMMEDIATE] or last_sent is None:
+                return topic, None
+            if wait is None or remaining < wait:
+                wait = remaining
+        return None, wait
+
+    async def _send_task(self):
+        while True:
+            self._event.clear()
+            topic, wait = self._next_topic(ticks_ms())
+            if topic is None:
+                try:
+                    if wait is None:
+                        await self._event.wait()
+                    else:
+                        await asyncio.wait_for_ms(self._event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            entry = self._topics[topic]
+            value = entry[_VALUE]
+            entry[_DIRTY] = False
+            entry[_IMMEDIATE] = False
+            entry[_LAST_SENT] = ticks_ms()
+            try:
+                _logger.debug(f'Publishing topic={topic}, value={value} ...')
+                await self._client.publish(topic, value, self._retain, self._qos)
+            except Exception as err:
+                _logger.error(f'_send_task(): Failed to publish topic {topic}: {err}, {type(err)}')
+                # Latest value must be delivered: retried after the interval unless replaced meanwhile.
+                entry[_DIRTY] = True
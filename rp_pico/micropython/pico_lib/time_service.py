@@ -0,0 +1,82 @@
+import utime
+from utime import ticks_ms, ticks_diff
+
+
+class Time_Service:
+    '''Fast wall-clock time (UTC) with ms resolution.
+
+    The time is anchored to ticks_ms() at the last synchronization with an NTP server (see Ntp_Client),
+    so reading it doesn't touch the RTC. The drift of the local clock is compensated.
+    Before the first synchronization the time of the RTC is used (1 s resolution).
+    ticks_diff() is only valid up to 2^29 ms (~6.2 days): time_ms() moves the anchor forward after
+    _MAX_ELAPSED_MS, it must be called at least once per _MAX_ELAPSED_MS (Ntp_Client's task does).
+    '''
+    _MAX_ELAPSED_MS = 1 << 28  # ~3.1 days
+    _anchor_ms = None     # Time in ms since epoch (1970-01-01) at ticks_ms() == _anchor_ticks
+    _anchor_ticks = None
+    _drift_ppm = 0
+    _synchronized_ms = None  # Time in ms since epoch at last synchronization (set_anchor())
+    # Cached ISO8601 date/time without fraction and time zone, e.g. '2022-09-16T12:34:56'.
+    _cached_seconds = None
+    _cached_prefix = ''
+
+    @classmethod
+    def set_anchor(cls, ticks, time_ms, drift_ppm = 0):
+        '''Set time (ms since epoch) at ticks_ms() == ticks and drift of local clock (ppm).'''
+        cls._anchor_ticks = ticks
+        cls._anchor_ms = time_ms
+        cls._drift_ppm = drift_ppm
+        cls._synchronized_ms = time_ms
+        cls._cached_seconds = None
+
+    @classmethod
+    def get_anchor(cls):
+        '''Returns (ticks, time_ms, drift_ppm) of anchor (last synchronization or moved forward) or None.'''
+        if cls._anchor_ticks is None:
+            return None
+        return (cls._anchor_ticks, cls._anchor_ms, cls._drift_ppm)
+
+    @classmethod
+    def get_synchronized_ms(cls):
+        '''Returns time in ms since epoch at last synchronization or None.'''
+        return cls._synchronized_ms
+
+    @classmethod
+    def is_synchronized(cls):
+        return cls._anchor_ticks is not None
+
+    @classmethod
+    def time_ms(cls, ticks = None):
+        '''Returns time in ms since epoch (1970-01-01) at ticks_ms() value ticks (default: now).'''
+        if ticks is None:
+            ticks = ticks_ms()
+        if cls._anchor_ticks is None:
+            return utime.time() * 1000
+        elapsed = ticks_diff(ticks, cls._anchor_ticks)
+        time_ms = cls._anchor_ms + elapsed + elapsed * cls._drift_ppm // 1000000
+        if elapsed > cls._MAX_ELAPSED_MS:
+            # Move anchor forward before ticks_diff() to it overflows (NTP failed for days).
+            cls._anchor_ticks = ticks
+            cls._anchor_ms = time_ms
+        return time_ms
+
+    @classmethod
+    def iso_prefix(cls, seconds):
+        '''Returns ISO8601 date/time without fraction and time zone, e.g. '2022-09-16T12:34:56'.
+
+        The string is cached, it is only formatted once per second.
+        '''
+        if seconds != cls._cached_seconds:
+            tm = utime.gmtime(seconds)
+            cls._cached_prefix = '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}'.format(tm[0], tm[1], tm[2], tm[3], tm[4], tm[5])
+            cls._cached_seconds = seconds
+        return cls._cached_prefix
+
+    @classmethod
+    def now_iso(cls, with_ms = True):
+        '''Returns current time as ISO8601 string, e.g. '2022-09-16T12:34:56.789+00:00'.'''
+        time_ms = cls.time_ms()
+        prefix = cls.iso_prefix(time_ms // 1000)
+        if with_ms:
+            return '{}.{:03d}+00:00'.format(prefix, time_ms % 1000)
+        return prefix + '+00:00'
@@ -1,53 +1,146 @@
 import usocket as socket
 from uerrno import ETIMEDOUT, EAGAIN
-import time
-from utime import ticks_ms
+from utime import ticks_ms, ticks_diff
 import uasyncio as asyncio
 
 from .logging_enhanced import Logger_Enhanced
-_logger =  Logger_Enhanced.get_logger_for_module(__name__) 
+_logger =  Logger_Enhanced.get_logger_for_module(__name__)
 
-class Udp_Client:
-    MAX_SEND_RETRIES = 5
-    MAX_RECEIVE_RETRIES = 10
-    RECEIVE_LOOP_DELAY = 10 # ms
-    SEND_LOOP_DELAY = 1000 # ms
 
-    def __init__(self) -> None:
-        pass
+class _Exchange:
+    '''One outstanding request/response exchange, waiting for the response with matching key.'''
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.data = None
+
+
+class _Udp_Endpoint:
+    '''Non-blocking UDP socket for one destination (ip, port).
 
-    async def send_and_receive(self, send_data, receive_size, ip, port):
-        receive_data = None
+    A single receive task awaits readability of the socket (no polling) and hands each received
+    datagram to the outstanding exchange whose key matches. The key of a received datagram is
+    determined by the caller-supplied function key_of(data), default: all datagrams have key None.
+    '''
+    def __init__(self, ip, port, receive_size, key_of = None):
+        self._addr = (ip, port)
+        self._receive_size = receive_size
+        self.key_of = key_of  # As supplied, see Udp_Client.send_and_receive()
+        self._key_of = key_of if key_of else (lambda data: None)
+        self._exchanges = {}  # dict: key -> _Exchange
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._socket.setblocking(False)
-        send_retries = self.MAX_SEND_RETRIES
-        while send_retries > 0:
-            receive_retries = self.MAX_RECEIVE_RETRIES
-            res = self._socket.sendto(send_data, (ip, port))
-            start_time = time.ticks_ms()
-            while receive_retries > 0:
+        self._receive_task = asyncio.create_task(self._receive())
+
+    def is_open(self):
+        return self._socket is not None
+
+    def close(self):
+        if self._receive_task:
+            self._receive_task.cancel()
+            self._receive_task = None
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+        # Wake up all waiting exchanges, they will return None.
+        for exchange in self._exchanges.values():
+            exchange.event.set()
+        self._exchanges.clear()
+
+    async def send_and_receive(self, send_data, receive_size, key, timeout_ms, max_send_retries):
+        '''Send datagram and wait for response with given key.
+
+        The datagram is resent if no response is received within timeout_ms, at most max_send_retries times.
+        Returns the received datagram or None.
+        '''
+        if key in self._exchanges:
+            raise ValueError(f'Exchange with key {key} is already outstanding.')
+        self._receive_size = max(self._receive_size, receive_size)
+        exchange = _Exchange()
+        self._exchanges[key] = exchange
+        try:
+            for _ in range(max_send_retries):
+                if not self._socket:
+                    break
+                self._socket.sendto(send_data, self._addr)
                 try:
-                    receive_data = self._socket.recv(receive_size)
-                    end_time = time.ticks_ms()
-                    self._socket.close()
-                    send_retries = receive_retries = 0
-                except OSError as err:
-                    receive_retries -= 1
-                    if err.errno == ETIMEDOUT or err.errno == EAGAIN:
-                        pass
-                    else:
-                        _logger.error(f'send_and_receive(): Other OSError while receiving from NTP server. Error: Error: {err}.')
-                    if receive_retries > 0:
-                        await asyncio.sleep_ms(self.RECEIVE_LOOP_DELAY)
-                    else:
-                        end_time = time.ticks_ms()
-                        send_retries -= 1
-                        if send_retries > 0:
-                            await asyncio.sleep_ms(self.SEND_LOOP_DELAY)
-                        else:
-                            self._socket.close()
-                except Exception as err:
-                    _logger.error(f'send_and_receive(): Exception while receiving from NTP server. Error: {err}, type: {type(err)}.')
-                    raise
-                else:
-                    return receive_data
+                    await asyncio.wait_for_ms(exchange.event.wait(), timeout_ms)
+                except asyncio.TimeoutError:
+                    _logger.debug(f'send_and_receive(): No response from {self._addr} within {timeout_ms} ms.')
+                    continue
+                return exchange.data
+            return None
+        finally:
+            if self._exchanges.get(key) is exchange:
+                del self._exchanges[key]
+
+    async def _receive(self):
+        reader = asyncio.StreamReader(self._socket)
+        while True:
+            try:
+                data = await reader.read(self._receive_size)
+            except OSError as err:
+                if err.args[0] in (ETIMEDOUT, EAGAIN):
+                    continue  # Nothing received (busy socket), keep receiving.
+                _logger.error(f'_receive(): OSError while receiving from {self._addr}. Error: {err}.')
+                self._receive_task = None
+                self.close()
+                return
+            if not data:
+                continue
+            key = self._key_of(data)
+            exchange = self._exchanges.get(key)
+            if exchange and exchange.data is None:
+                exchange.data = data
+                exchange.event.set()
+            else:
+                _logger.debug(f'_receive(): Dropped unexpected datagram from {self._addr}, key {key}.')
+
+
+class Udp_Client:
+    '''Asynchronous UDP request/response client.
+
+    Reuses one socket per destination (ip, port) and supports several outstanding exchanges per
+    destination, matched by a caller-supplied key (see send_and_receive()).
+    '''
+    MAX_SEND_RETRIES = 5
+    RECEIVE_TIMEOUT = 1000 # ms, per sent datagram
+
+    def __init__(self) -> None:
+        self._endpoints = {}  # dict: (ip, port) -> _Udp_Endpoint
+
+    async def send_and_receive(self, send_data, receive_size, ip, port, *, key = None, key_of = None,
+                               timeout_ms = None, max_send_retries = None):
+        '''Send datagram to (ip, port) and return response or None if no response has been received.
+
+        key : Key of this exchange, the response must have the same key.
+        key_of : Function returning the key of a received datagram, e.g. a sequence number or
+                 echoed timestamp. All exchanges with (ip, port) must use the same key_of,
+                 otherwise ValueError is raised.
+        timeout_ms : Time to wait for the response before the datagram is resent.
+        max_send_retries : Max. number of times the datagram is sent.
+        '''
+        if timeout_ms is None:
+            timeout_ms = self.RECEIVE_TIMEOUT
+        if max_send_retries is None:
+            max_send_retries = self.MAX_SEND_RETRIES
+        endpoint = self._endpoints.get((ip, port))
+        if endpoint is None or not endpoint.is_open():
+            endpoint = _Udp_Endpoint(ip, port, receive_size, key_of)
+            self._endpoints[(ip, port)] = endpoint
+        elif key_of != endpoint.key_of:
+            raise ValueError(f'Exchanges with {ip}:{port} already use another key_of.')
+        start_time = ticks_ms()
+        try:
+            receive_data = await endpoint.send_and_receive(send_data, receive_size, key, timeout_ms, max_send_retries)
+        except OSError as err:
+            _logger.error(f'send_and_receive(): OSError while sending to {ip}:{port}. Error: {err}.')
+            endpoint.close()
+            return None
+        _logger.debug(f'send_and_receive(): Exchange with {ip}:{port} took {ticks_diff(ticks_ms(), start_time)} ms.')
+        return receive_data
+
+    def close(self):
+        '''Close the sockets of all destinations.'''
+        for endpoint in self._endpoints.values():
+            endpoint.close()
+        self._endpoints.clear()
@@ -11,6 +11,9 @@ class _Settings(Settings_Base):
         super().__init__()
         self.ssid = ''
         self.password = ''
+        # RP2 WiFi power management (see wifi.config(pm)), None: power saving off (0xa11140).
+        # E.g. 0xa11142 (10555714): power saving on (firmware default).
+        self.pm = None
 
 class Wifi:
     '''Set up WiFi/WLAN.'''
@@ -52,7 +55,7 @@ class Wifi:
             
         # See https://datasheets.raspberrypi.com/picow/connecting-to-the-internet-with-pico-w.pdf
         # See chapter 3.6.3. Power-saving mode.
-        wifi.config(pm = 0xa11140)
+        wifi.config(pm = 0xa11140 if self._settings.pm is None else self._settings.pm)
         _logger.info(f'Connecting to WiFi with SSID \'{self._settings.ssid}\' ...')
         wifi.connect(self._settings.ssid, self._settings.password)
         max_time_to_connect = 60
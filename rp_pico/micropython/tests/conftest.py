@@ -0,0 +1,23 @@
+# Tests run under CPython with the host emulation (see host_emulation), from rp_pico/micropython:
+#   python -m pytest -q tests
+# host_emulation.setup() must run before pico_lib is imported: it provides machine, uasyncio etc.
+# and makes a temporary directory with the configuration of mqtt_pub_sub_01 the current directory.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import host_emulation
+from host_emulation.mqtt_broker import Mqtt_Broker
+
+host_emulation.setup('mqtt_pub_sub_01')
+
+
+@pytest.fixture
+def broker():
+    '''Local MQTT broker, config/app_settings.json of the emulated Pico points to it.'''
+    broker = Mqtt_Broker().start()
+    host_emulation.setup('mqtt_pub_sub_01', root = os.getcwd(), settings = {'mqtt': {'host': '127.0.0.1', 'port': broker.port}})
+    yield broker
+    broker.close()
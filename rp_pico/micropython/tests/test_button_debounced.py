@@ -0,0 +1,125 @@
+# Simulated IRQs (machine.Pin.simulate() calls Button_Debounced._on_button_changed()) with bouncing
+# edges: checks debounced callbacks, lost events and release / long press / repeat events.
+import pytest
+import uasyncio as asyncio
+from machine import Pin
+
+from pico_lib import Button_Debounced
+
+PIN = 5
+
+
+@pytest.fixture(autouse = True)
+def reset_buttons():
+    '''Button_Debounced keeps its buttons, ring buffer and dispatcher task in the class: every test gets a new loop.'''
+    Button_Debounced._buttons = []
+    Button_Debounced._dispatcher = None
+    Button_Debounced._timer = None
+    Button_Debounced._flag = asyncio.ThreadSafeFlag()
+    for i in range(3):
+        Button_Debounced._queue_index[i] = 0
+    Pin(PIN, Pin.IN, Pin.PULL_UP)
+    yield
+    if Button_Debounced._timer:
+        Button_Debounced._timer.deinit()
+
+
+def _bounce(*levels):
+    for level in levels:
+        Pin.simulate(PIN, level)
+
+
+def test_bouncing_edges_are_reported_once():
+    states = []
+
+    async def on_changed(name, state):
+        states.append((name, state))
+
+    async def main():
+        button = Button_Debounced(PIN, on_changed, debouncing_time = 20)
+        await asyncio.sleep_ms(10)
+        _bounce(0, 1, 0, 1, 0)  # Press
+        await asyncio.sleep_ms(100)
+        assert button.get_state() == 0
+        _bounce(1, 0, 1)  # Release
+        await asyncio.sleep_ms(100)
+        assert button.get_state() == 1
+        assert button.get_lost_events() == 0
+
+    asyncio.run(main())
+    assert states == [('button_5', 0), ('button_5', 1)]
+
+
+def test_glitch_shorter_than_debouncing_window_is_ignored():
+    states = []
+
+    async def on_changed(name, state):
+        states.append(state)
+
+    async def main():
+        Button_Debounced(PIN, on_changed, debouncing_time = 20)
+        await asyncio.sleep_ms(10)
+        _bounce(0, 1)
+        await asyncio.sleep_ms(100)
+
+    asyncio.run(main())
+    assert states == []
+
+
+def test_full_ring_buffer_counts_lost_events():
+    async def on_changed(name, state):
+        pass
+
+    async def main():
+        button = Button_Debounced(PIN, on_changed)
+        await asyncio.sleep_ms(10)
+        # Dispatcher can't run meanwhile: the ring buffer holds QUEUE_SIZE - 1 edges.
+        _bounce(*[0, 1] * 20)
+        assert button.get_lost_events() == 40 - (Button_Debounced.QUEUE_SIZE - 1)
+        await asyncio.sleep_ms(100)
+        assert button.get_state() == 1
+
+    asyncio.run(main())
+
+
+def test_release_long_press_and_repeat_events():
+    events = []
+
+    async def on_event(name, event, duration):
+        events.append((event, duration))
+
+    async def main():
+        Button_Debounced(PIN, None, debouncing_time = 20, event_callback = on_event,
+                         long_press_time = 100, repeat_time = 50)
+        await asyncio.sleep_ms(10)
+        _bounce(0, 1, 0)
+        await asyncio.sleep_ms(280)  # Long press at 100 ms, repeats at 150, 200, 250 ms
+        _bounce(1)
+        await asyncio.sleep_ms(100)
+
+    asyncio.run(main())
+    names = [event for event, _ in events]
+    assert names[0] == Button_Debounced.EVENT_LONG_PRESS
+    assert names[-1] == Button_Debounced.EVENT_RELEASED
+    assert 2 <= names.count(Button_Debounced.EVENT_REPEAT) <= 4
+    assert 90 <= events[0][1] <= 150
+    assert 260 <= events[-1][1] <= 400
+
+
+def test_short_press_emits_only_release():
+    events = []
+
+    async def on_event(name, event, duration):
+        events.append((event, duration))
+
+    async def main():
+        Button_Debounced(PIN, None, event_callback = on_event, long_press_time = 500)
+        await asyncio.sleep_ms(10)
+        _bounce(0)
+        await asyncio.sleep_ms(100)
+        _bounce(1)
+        await asyncio.sleep_ms(100)
+
+    asyncio.run(main())
+    assert [event for event, _ in events] == [Button_Debounced.EVENT_RELEASED]
+    assert 80 <= events[0][1] <= 200
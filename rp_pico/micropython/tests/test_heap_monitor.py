@@ -0,0 +1,44 @@
+# Heap_Monitor sections: allocations are recorded only if no garbage collection happened within the
+# section. gc.mem_alloc() is emulated with tracemalloc, see host_emulation.
+import tracemalloc
+
+import pytest
+
+from pico_lib import Heap_Monitor, Metrics
+
+
+@pytest.fixture(autouse = True)
+def traced():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+def test_section_records_allocation():
+    histogram = Heap_Monitor.histogram('test.section')
+    count = histogram.count
+    start = Heap_Monitor.begin()
+    block = bytearray(10000)
+    Heap_Monitor.end(histogram, start)
+    assert histogram.count == count + 1
+    assert histogram.max >= len(block)
+
+
+def test_section_with_collection_followed_by_allocation_is_not_recorded():
+    histogram = Heap_Monitor.histogram('test.collected')
+    garbage = [bytearray(1000) for _ in range(10)]
+    start = Heap_Monitor.begin()
+    del garbage
+    Heap_Monitor.collect()
+    block = bytearray(20000)  # gc.mem_alloc() above its value at begin() again
+    Heap_Monitor.end(histogram, start)
+    assert len(block) and histogram.count == 0
+
+
+def test_section_spanning_heap_probe_is_not_recorded():
+    histogram = Heap_Monitor.histogram('test.probed')
+    start = Heap_Monitor.begin()
+    Metrics.update_heap(probe_largest = True)
+    block = bytearray(20000)
+    Heap_Monitor.end(histogram, start)
+    assert len(block) and histogram.count == 0
@@ -0,0 +1,80 @@
+# Iso8601: formatting into buffers and parsing, checked against CPython's calendar/time.
+import calendar
+import time
+
+import pytest
+
+from pico_lib import Iso8601
+
+# 1970, leap days (2000 is a leap year, 2100 isn't), end of year, 2038 (2^31 s) and later.
+EPOCH_SECONDS = (0, 951782400, 951868799, 1234567890, 1663331696, 1704067199, 2147483648, 4107542400, 4107628799)
+
+
+@pytest.mark.parametrize('seconds', EPOCH_SECONDS)
+def test_gmtime_buffer_round_trip(seconds):
+    tm = time.gmtime(seconds)
+    buffer = bytearray(Iso8601.ISO_LENGTH)
+    assert Iso8601.formatTimeGmtimeToIsoBuffer(tm, buffer) == Iso8601.ISO_LENGTH
+    assert bytes(buffer).decode() == Iso8601.formatTimeGmtimeToIso(tm)
+    assert Iso8601.parseIsoToEpochMs(buffer) == seconds * 1000
+
+
+@pytest.mark.parametrize('seconds', EPOCH_SECONDS)
+def test_rtc_buffer_with_ms_round_trip(seconds):
+    tm = time.gmtime(seconds)
+    rtc = (tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0)  # rtc.datetime(): weekday at index 3
+    buffer = bytearray(Iso8601.ISO_LENGTH_MS + 4)
+    written = Iso8601.formatRtcDatetimeToIsoBuffer(rtc, memoryview(buffer), 789, 2)
+    assert written == Iso8601.ISO_LENGTH_MS
+    assert buffer[:2] == b'\0\0' and buffer[-2:] == b'\0\0'
+    assert bytes(buffer[2:2 + written]).decode() == Iso8601.formatRtcDatetimeToIso(rtc)[:19] + '.789+00:00'
+    assert Iso8601.parseIsoToEpochMs(buffer[2:2 + written]) == seconds * 1000 + 789
+
+
+def test_every_day_of_leap_and_common_years():
+    for year in (1999, 2000, 2023, 2024, 2100):
+        for month in range(1, 13):
+            for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                expected = calendar.timegm((year, month, day, 0, 0, 0)) * 1000
+                assert Iso8601.parseIsoToEpochMs(f'{year:04d}-{month:02d}-{day:02d}T00:00:00Z') == expected
+
+
+@pytest.mark.parametrize('text, ms', [
+    ('2022-09-16T12:34:56', 1663331696000),
+    ('2022-09-16 12:34:56Z', 1663331696000),
+    ('2022-09-16T12:34:56.7Z', 1663331696700),
+    ('2022-09-16T12:34:56,789123+00:00', 1663331696789),
+    ('2022-09-16T14:34:56.789+02:00', 1663331696789),
+    ('2022-09-16T07:04:56-05:30', 1663331696000),
+    (b'2024-02-29T00:00:00Z', 1709164800000),
+])
+def test_parse(text, ms):
+    assert Iso8601.parseIsoToEpochMs(text) == ms
+
+
+@pytest.mark.parametrize('text', [
+    b'2022-02-29T00:00:00Z',        # No leap year
+    b'2100-02-29T00:00:00Z',        # No leap year (century)
+    b'2022-02-30T00:00:00Z',
+    b'2022-04-31T00:00:00Z',
+    b'2022-00-10T00:00:00Z',
+    b'2022-13-10T00:00:00Z',
+    b'2022-09-00T00:00:00Z',
+    b'2022-09-16T24:00:00Z',
+    b'2022-09-16T12:60:00Z',
+    b'2022-09-16T12:34:61Z',
+    b'2022-09-16T12:34:56.+00:00',  # Separator without digits
+    b'2022-09-16T12:34:56.',
+    b'2022-09-16T12:34:56,Z',
+    b'2022-09-16T12:34:56+24:00',
+    b'2022-09-16T12:34:56+02:60',
+    b'2022-09-16T12:34:56+0200',
+    b'2022-09-16T12:34:56X',
+    b'2022-09-16X12:34:56',
+    b'2022-9-16T12:34:56',
+    b'2022-09-16T12:34',
+    b'20a2-09-16T12:34:56',
+])
+def test_parse_invalid(text):
+    with pytest.raises(ValueError):
+        Iso8601.parseIsoToEpochMs(text)
@@ -0,0 +1,23 @@
+# Loop_Profiler sections recorded outside the loop (e.g. timer callbacks) are picked up from the loop.
+import uasyncio as asyncio
+from machine import Timer
+
+from pico_lib import Loop_Profiler
+
+
+def test_section_recorded_by_timer_callback_is_picked_up():
+    section = Loop_Profiler.section('test_timer')
+
+    def on_timer(timer):
+        section.record(12345678)
+
+    async def main():
+        timer = Timer()
+        timer.init(mode = Timer.ONE_SHOT, period = 10, callback = on_timer)
+        await asyncio.sleep_ms(50)
+        timer.deinit()
+
+    asyncio.run(main())
+    assert section.max_us == 12345678  # Only recorded, not yet accounted
+    assert (12345678, 'test_timer') in Loop_Profiler.get_slowest()
+    assert section.max_us == 0
@@ -0,0 +1,57 @@
+# Low power profile against the local broker, without and with TLS: a burst of messages sent with one
+# write (one TLS record) is received completely, without waiting for the next packet or keepalive ping.
+import os
+import shutil
+import subprocess
+
+import pytest
+import uasyncio as asyncio
+
+import host_emulation
+from host_emulation.mqtt_broker import Mqtt_Broker, create_certificate
+from pico_lib import MQTTClient_enhanced
+
+TOPIC = 'test/low_power'
+MESSAGES = 20
+
+
+@pytest.fixture(params = [False, True], ids = ['plain', 'tls'])
+def low_power_broker(request, tmp_path):
+    '''Local broker, the emulated Pico connects with low_power (and TLS for param True).'''
+    settings = {'host': '127.0.0.1', 'low_power': True, 'use_ssl': request.param}
+    certfile = keyfile = None
+    if request.param:
+        if shutil.which('openssl') is None:
+            pytest.skip('openssl not available')
+        try:
+            certfile, keyfile = create_certificate(str(tmp_path))
+        except subprocess.CalledProcessError:
+            pytest.skip('creating certificate failed')
+        settings.update(client_cert_file_path = certfile, private_key_file_path = keyfile)
+    broker = Mqtt_Broker(certfile = certfile, keyfile = keyfile).start()
+    settings['port'] = broker.port
+    host_emulation.setup('mqtt_pub_sub_01', root = os.getcwd(), settings = {'mqtt': settings})
+    yield broker
+    broker.close()
+
+
+def test_burst_is_received_without_waiting_for_next_packet(low_power_broker):
+    received = []
+
+    def handler(topic, msg, retained):
+        received.append(bytes(msg))
+
+    async def main():
+        client = MQTTClient_enhanced()
+        await client.connect()
+        await client.subscribe(TOPIC, handler)
+        await asyncio.sleep_ms(100)
+        low_power_broker.publish_many(TOPIC, [b'%d' % i for i in range(MESSAGES)])
+        for _ in range(100):  # 1 s, far below the keepalive interval
+            if len(received) == MESSAGES:
+                break
+            await asyncio.sleep_ms(10)
+        await client.disconnect()
+
+    asyncio.run(main())
+    assert received == [b'%d' % i for i in range(MESSAGES)]
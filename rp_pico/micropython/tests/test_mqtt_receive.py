@@ -0,0 +1,33 @@
+# Zero-copy receive against the local broker: with rx_buffer_size > 0 and no inbound queue (see
+# mqtt_pub_sub_01/config/app_settings.json) handlers get read-only memoryviews into the receive buffer.
+import uasyncio as asyncio
+
+from pico_lib import MQTTClient_enhanced
+
+TOPIC = 'test/receive'
+
+
+def test_handlers_get_read_only_views(broker):
+    received = []
+
+    def handler(topic, msg, retained):
+        received.append((bytes(topic), msg.readonly, bytes(msg)))
+        try:
+            msg[0] = 0
+        except TypeError:
+            received.append('read-only')
+
+    async def main():
+        client = MQTTClient_enhanced()
+        await client.connect()
+        await client.subscribe(TOPIC, handler)
+        await asyncio.sleep_ms(100)
+        broker.publish(TOPIC, b'payload')
+        for _ in range(100):
+            if received:
+                break
+            await asyncio.sleep_ms(10)
+        await client.disconnect()
+
+    asyncio.run(main())
+    assert received == [(TOPIC.encode(), True, b'payload'), 'read-only']
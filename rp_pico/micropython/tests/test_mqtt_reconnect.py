@@ -0,0 +1,90 @@
+# Broker-only reconnects (WiFi stays up) against the local broker: the broker drops all connections
+# (restart) or refuses them for a while. Checks that WiFi isn't re-associated and that reconnect
+# attempts follow reconnect_min_ms and the exponential backoff.
+import time
+
+import network
+import pytest
+import uasyncio as asyncio
+
+from pico_lib import MQTTClient_enhanced
+from pico_lib import mqtt_as
+
+RECONNECT_MIN_MS = 100
+RECONNECT_MAX_MS = 1600
+SLACK_MS = 200  # Connect (socket, CONNECT/CONNACK) and scheduling on the host
+
+
+@pytest.fixture(autouse = True)
+def reconnect_config(monkeypatch):
+    monkeypatch.setitem(mqtt_as.config, 'reconnect_min_ms', RECONNECT_MIN_MS)
+    monkeypatch.setitem(mqtt_as.config, 'reconnect_max_ms', RECONNECT_MAX_MS)
+
+
+@pytest.fixture
+def wifi_connects(monkeypatch):
+    '''List of times of WLAN.connect() calls, i.e. WiFi (re-)associations.'''
+    calls = []
+    connect = network.WLAN.connect
+
+    def counting_connect(self, *args, **kwargs):
+        calls.append(time.monotonic())
+        return connect(self, *args, **kwargs)
+
+    monkeypatch.setattr(network.WLAN, 'connect', counting_connect)
+    return calls
+
+
+async def _connected_client():
+    '''Returns connected client and event set by every established connection.'''
+    client = MQTTClient_enhanced()
+    established = asyncio.Event()
+
+    async def on_established(client):
+        established.set()
+
+    client.register_connection_established_handler(on_established)
+    await client.connect()
+    await asyncio.wait_for(established.wait(), 5)
+    established.clear()
+    return client, established
+
+
+def test_broker_restart_reconnects_without_wifi_reassociation(broker, wifi_connects):
+    async def main():
+        client, established = await _connected_client()
+        associations = len(wifi_connects)
+        start = time.monotonic()
+        broker.disconnect_all()
+        await asyncio.wait_for(established.wait(), 10)
+        elapsed_ms = (time.monotonic() - start) * 1000
+        assert len(wifi_connects) == associations
+        assert network.WLAN().isconnected()
+        await client.disconnect()
+        return elapsed_ms
+
+    elapsed_ms = asyncio.run(main())
+    # Link loss is detected within 1 s (_keep_connected), then the first backoff is [min / 2, min].
+    assert RECONNECT_MIN_MS // 2 <= elapsed_ms <= 1000 + RECONNECT_MIN_MS + SLACK_MS
+
+
+def test_refused_reconnects_back_off_exponentially(broker, wifi_connects):
+    async def main():
+        client, established = await _connected_client()
+        associations = len(wifi_connects)
+        first = len(broker.connect_times)
+        broker.refuse_connections = True
+        broker.disconnect_all()
+        await asyncio.sleep_ms(4000)
+        broker.refuse_connections = False
+        await asyncio.wait_for(established.wait(), 5)
+        assert len(wifi_connects) == associations
+        await client.disconnect()
+        return broker.connect_times[first:]
+
+    attempts = asyncio.run(main())
+    assert len(attempts) >= 5  # At least 4 refused attempts and the successful one
+    for i in range(len(attempts) - 1):
+        backoff = min(RECONNECT_MIN_MS << (i + 1), RECONNECT_MAX_MS)
+        interval_ms = (attempts[i + 1] - attempts[i]) * 1000
+        assert backoff // 2 <= interval_ms <= backoff + SLACK_MS, f'attempt {i + 1}: {interval_ms:.0f} ms, backoff {backoff} ms'
@@ -0,0 +1,129 @@
+# Streamed payloads (subscribe_stream()) against the local broker: payloads larger than stream_chunk
+# are delivered in chunks, a failing sink or stream handler discards the payload without affecting
+# the connection or the following messages.
+import uasyncio as asyncio
+
+from pico_lib import MQTTClient_enhanced, Metrics
+from pico_lib import mqtt_as
+
+TOPIC = 'test/stream'
+LARGE = bytes(i & 0xff for i in range(2000))  # > stream_chunk and > rx_buffer_size (received via _read_stream)
+SMALL = b'small payload'                      # Fits rx buffer: delivered as one chunk
+
+
+class _Sink:
+    '''Sink collecting the chunks, fails on chunk number fail_at (0: first) if fail_at isn't None.'''
+    def __init__(self, fail_at = None, error = OSError(28, 'ENOSPC')):
+        self.chunks = []
+        self.ended = False
+        self.calls = 0
+        self._fail_at = fail_at
+        self._error = error
+
+    def __call__(self, chunk):
+        self.calls += 1
+        if chunk is None:
+            self.ended = True
+            return
+        if len(self.chunks) == self._fail_at:
+            self._fail_at = None
+            raise self._error
+        self.chunks.append(bytes(chunk))
+
+
+async def _receive(broker, sinks, payloads, expected_sinks = None):
+    '''Publish payloads from the broker, returns when the last of expected_sinks (default: one per payload) ended.'''
+    expected_sinks = expected_sinks or len(payloads)
+    for payload in payloads:
+        broker.publish(TOPIC, payload)
+    for _ in range(500):
+        if len(sinks) == expected_sinks and sinks[-1].ended:
+            return
+        await asyncio.sleep_ms(10)
+    raise AssertionError(f'{len(sinks)} of {expected_sinks} sinks created')
+
+
+def _run(broker, handler, payloads):
+    '''Subscribe handler for TOPIC, receive payloads, returns (reconnects, stream errors) caused.'''
+    reconnects = Metrics.counter('mqtt.reconnects')
+    stream_errors = Metrics.counter('mqtt.stream_errors')
+
+    async def main():
+        client = MQTTClient_enhanced()
+        await client.connect()
+        await client.subscribe_stream(TOPIC, handler)
+        await asyncio.sleep_ms(100)
+        before = reconnects.value, stream_errors.value, broker.connects
+        await _receive(broker, handler.sinks, payloads)
+        assert client.isconnected()
+        after = reconnects.value, stream_errors.value, broker.connects
+        await client.disconnect()
+        return after[0] - before[0], after[1] - before[1], after[2] - before[2]
+
+    reconnects, errors, connects = asyncio.run(main())
+    assert connects == 0
+    return reconnects, errors
+
+
+def _handler(*sinks):
+    '''Stream handler returning sinks in turn, sinks created are in handler.sinks.'''
+    def handler(topic, length, retained):
+        sink = sinks[len(handler.sinks)] if len(handler.sinks) < len(sinks) else _Sink()
+        handler.sinks.append(sink)
+        return sink
+    handler.sinks = []
+    return handler
+
+
+def test_large_payload_is_delivered_in_chunks(broker):
+    handler = _handler()
+    assert _run(broker, handler, [LARGE]) == (0, 0)
+    sink = handler.sinks[0]
+    assert sink.ended
+    assert len(sink.chunks) == -(-len(LARGE) // mqtt_as.config['stream_chunk'])
+    assert max(len(chunk) for chunk in sink.chunks) == mqtt_as.config['stream_chunk']
+    assert b''.join(sink.chunks) == LARGE
+
+
+def test_sink_oserror_discards_payload_and_keeps_connection(broker):
+    failing = _Sink(fail_at = 2)
+    handler = _handler(failing)
+    assert _run(broker, handler, [LARGE, LARGE]) == (0, 1)
+    # Rest of the payload discarded: the sink isn't called after the error, not even with None.
+    assert len(failing.chunks) == 2 and failing.calls == 3 and not failing.ended
+    # Following message is complete: the failed payload was drained from the connection.
+    assert handler.sinks[1].ended and b''.join(handler.sinks[1].chunks) == LARGE
+
+
+def test_sink_other_error_keeps_message_handling(broker):
+    failing = _Sink(fail_at = 0, error = ValueError('bad chunk'))
+    handler = _handler(failing, _Sink(fail_at = 0, error = MemoryError()))
+    assert _run(broker, handler, [SMALL, LARGE, SMALL]) == (0, 2)
+    assert not failing.ended
+    assert handler.sinks[2].ended and b''.join(handler.sinks[2].chunks) == SMALL
+
+
+def test_failing_stream_handler_discards_payload(broker):
+    def handler(topic, length, retained):
+        handler.calls += 1
+        if handler.calls == 1:
+            raise OSError(28, 'ENOSPC')
+        sink = _Sink()
+        handler.sinks.append(sink)
+        return sink
+    handler.calls = 0
+    handler.sinks = []
+
+    async def main():
+        client = MQTTClient_enhanced()
+        await client.connect()
+        await client.subscribe_stream(TOPIC, handler)
+        await asyncio.sleep_ms(100)
+        connects = broker.connects
+        await _receive(broker, handler.sinks, [LARGE, LARGE], 1)
+        assert broker.connects == connects and client.isconnected()
+        await client.disconnect()
+
+    asyncio.run(main())
+    assert handler.calls == 2
+    assert handler.sinks[0].ended and b''.join(handler.sinks[0].chunks) == LARGE
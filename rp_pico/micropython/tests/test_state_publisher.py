@@ -0,0 +1,55 @@
+# State_Publisher with a fake MQTT client: coalescing, delivery of the latest value after a failed
+# publish and idle topics.
+import uasyncio as asyncio
+
+from pico_lib.state_publisher import State_Publisher, _LAST_SENT
+
+INTERVAL_MS = 50
+
+
+class _Client:
+    '''Records published values, the first `failures` publish() calls raise OSError.'''
+    def __init__(self, failures = 0):
+        self.published = []
+        self._failures = failures
+
+    async def publish(self, topic, value, retain, qos):
+        if self._failures:
+            self._failures -= 1
+            raise OSError(-1)
+        self.published.append((topic, value))
+
+
+def _run(client, steps):
+    '''steps: list of (ms to sleep before, topic, value) published, returns the publisher.'''
+    async def main():
+        publisher = State_Publisher(client, INTERVAL_MS)
+        publisher.start()
+        for sleep_ms, topic, value in steps:
+            await asyncio.sleep_ms(sleep_ms)
+            publisher.publish(topic, value)
+        await asyncio.sleep_ms(3 * INTERVAL_MS)
+        publisher.stop()
+        return publisher
+
+    return asyncio.run(main())
+
+
+def test_changes_within_interval_are_coalesced():
+    client = _Client()
+    publisher = _run(client, [(0, 'a', 1), (0, 'b', 1), (5, 'a', 2), (5, 'a', 3)])
+    assert client.published == [('a', 1), ('b', 1), ('a', 3)]
+    assert publisher.get_coalesced_count('a') == 1
+
+
+def test_latest_value_is_delivered_after_failed_publish():
+    client = _Client(failures = 2)
+    _run(client, [(0, 'a', 1)])
+    assert client.published == [('a', 1)]
+
+
+def test_last_sent_is_reset_when_interval_elapsed():
+    client = _Client()
+    publisher = _run(client, [(0, 'a', 1)])
+    # Next change is sent immediately without comparing ticks of long ago (wrap after 2^30 ms).
+    assert publisher._topics['a'][_LAST_SENT] is None
@@ -0,0 +1,57 @@
+# Udp_Client against a local UDP echo server: exchanges matched by key, one key_of per destination.
+import socket
+import threading
+
+import pytest
+import uasyncio as asyncio
+
+from pico_lib.udp_client import Udp_Client
+
+
+@pytest.fixture
+def echo_port():
+    '''Port of a UDP server on 127.0.0.1 echoing each datagram.'''
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+
+    def serve():
+        while True:
+            try:
+                data, addr = server.recvfrom(100)
+            except OSError:
+                return
+            server.sendto(data, addr)
+
+    threading.Thread(target = serve, daemon = True).start()
+    yield server.getsockname()[1]
+    server.close()
+
+
+def _first_byte(data):
+    return data[0]
+
+
+def test_responses_are_matched_by_key(echo_port):
+    async def main():
+        client = Udp_Client()
+        try:
+            return await asyncio.gather(
+                client.send_and_receive(b'\x01a', 2, '127.0.0.1', echo_port, key = 1, key_of = _first_byte),
+                client.send_and_receive(b'\x02b', 2, '127.0.0.1', echo_port, key = 2, key_of = _first_byte))
+        finally:
+            client.close()
+
+    assert asyncio.run(main()) == [b'\x01a', b'\x02b']
+
+
+def test_other_key_of_for_same_destination_is_rejected(echo_port):
+    async def main():
+        client = Udp_Client()
+        try:
+            await client.send_and_receive(b'\x01a', 2, '127.0.0.1', echo_port, key = 1, key_of = _first_byte)
+            with pytest.raises(ValueError):
+                await client.send_and_receive(b'\x01a', 2, '127.0.0.1', echo_port, key = 1)
+        finally:
+            client.close()
+
+    asyncio.run(main())